@@ -0,0 +1,59 @@
+"""
+Benchmark of the NumPy batch functions in qth_locator_distance_city.py against the
+scalar maidenhead_to_latlon and haversine_km, which also checks that the results are identical.
+
+Execution (from the repository folder):
+python benchmarks/bench_batch.py
+"""
+
+import os
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import numpy as np
+
+from generators import random_locators
+from qth_locator_distance_city import (haversine_km, haversine_km_batch, haversine_km_matrix,
+                                       maidenhead_to_latlon, maidenhead_to_latlon_batch)
+
+def main(n=100000):
+    locators = random_locators(n)
+
+    t0 = time.perf_counter()
+    scalar = [maidenhead_to_latlon(loc) for loc in locators]
+    t_scalar = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    lat, lon = maidenhead_to_latlon_batch(locators)
+    t_batch = time.perf_counter() - t0
+    assert scalar == list(zip(lat.tolist(), lon.tolist())), "decoded locators differ"
+    print(f"maidenhead_to_latlon, {n} locators: scalar {t_scalar * 1000:.1f} ms, "
+          f"batch {t_batch * 1000:.1f} ms, speedup {t_scalar / t_batch:.1f}x, identical")
+
+    lat2, lon2 = lat[::-1].copy(), lon[::-1].copy()
+    t0 = time.perf_counter()
+    scalar = [haversine_km(a, b, c, d) for a, b, c, d in
+              zip(lat.tolist(), lon.tolist(), lat2.tolist(), lon2.tolist())]
+    t_scalar = time.perf_counter() - t0
+    for exact in (True, False):
+        t0 = time.perf_counter()
+        batch = haversine_km_batch(lat, lon, lat2, lon2, exact=exact)
+        t_batch = time.perf_counter() - t0
+        max_diff = np.max(np.abs(batch - np.array(scalar)))
+        print(f"haversine_km pairwise, exact={exact}: scalar {t_scalar * 1000:.1f} ms, "
+              f"batch {t_batch * 1000:.1f} ms, speedup {t_scalar / t_batch:.1f}x, "
+              f"max difference {max_diff:.3g} km")
+        if exact:
+            assert batch.tolist() == scalar, "exact distances differ"
+
+    m = 1000
+    t0 = time.perf_counter()
+    matrix = haversine_km_matrix(lat[:m], lon[:m], lat2[:m], lon2[:m])
+    t_matrix = time.perf_counter() - t0
+    assert matrix[3, 7] == haversine_km(lat[3], lon[3], lat2[7], lon2[7])
+    print(f"haversine_km_matrix {m}x{m}: {t_matrix * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
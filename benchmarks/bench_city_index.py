@@ -0,0 +1,57 @@
+"""
+Benchmark of the nearest large city lookup in qth_locator_distance_city.py:
+the linear scan find_nearest_large_city against the k-d tree CityIndex.
+Both have to give identical results for random positions on the whole globe.
+
+Execution (from the repository folder):
+python benchmarks/bench_city_index.py
+"""
+
+import os
+import sys
+import time
+
+# The scripts live in the repository folder, one level up
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from generators import random_positions
+from qth_locator_distance_city import CityIndex, find_nearest_large_city, get_large_cities, haversine_km
+
+def main(n=2000):
+    positions = random_positions(n)
+    large_cities_list = get_large_cities()
+
+    t0 = time.perf_counter()
+    index = CityIndex(large_cities_list)
+    t_build = time.perf_counter() - t0
+    print(f"{len(large_cities_list)} cities, index built in {t_build * 1000:.1f} ms")
+
+    for popul in (100000, 1000000):
+        t0 = time.perf_counter()
+        linear = [find_nearest_large_city(lat, lon, large_cities_list, popul) for lat, lon in positions]
+        t_linear = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        indexed = [index.nearest(lat, lon, popul) for lat, lon in positions]
+        t_index = time.perf_counter() - t0
+
+        mismatches = sum(a != b for a, b in zip(linear, indexed))
+        print(f"popul >= {popul}: linear {t_linear / n * 1e6:.1f} us/query, "
+              f"index {t_index / n * 1e6:.1f} us/query, speedup {t_linear / t_index:.1f}x, "
+              f"mismatches: {mismatches}")
+        if mismatches:
+            sys.exit(1)
+
+    # k nearest and radius queries, compared with a brute force sort
+    for lat, lon in positions[:200]:
+        brute = sorted((haversine_km(lat, lon, c[2], c[3]), i)
+                       for i, c in enumerate(large_cities_list) if c[5] >= 100000)
+        knn = index.query(lat, lon, k=5)
+        assert [d for d, _ in knn] == [d for d, _ in brute[:5]]
+        within = index.query_radius(lat, lon, 500.0)
+        assert [d for d, _ in within] == [d for d, i in brute if d <= 500.0]
+    print("k nearest and radius queries: identical to brute force")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark of the Python predictive denoiser (predictive_denoiser.py) for filter orders 4..256:
+throughput of the block mode (adapting and frozen) as multiple of real time at 16 kHz,
+and validation against the sample by sample reference port of predictiveDenoiser.html, also over the
+whole mu range of the slider of predictiveDenoiser.html (0..1): the block mode has to stay stable, and
+remove as much noise as the reference, with the prediction error power within 10% of it.
+
+Execution (from the repository folder):
+python benchmarks/bench_denoiser.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from generators import synthetic_speech
+from predictive_denoiser import PredictiveDenoiser, nlms_reference
+
+RATE = 16000
+ORDERS = (4, 8, 16, 32, 64, 128, 256)
+MU_RANGE = (0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 1.0)
+TOLERANCE = 1.1  # prediction error power, block mode / reference
+PEAK_TOLERANCE = 1.5  # output peak, block mode / reference (stability)
+
+def throughput(denoiser, x):
+    t0 = time.perf_counter()
+    denoiser.process(x)
+    return len(x) / RATE / (time.perf_counter() - t0)
+
+def main(seconds=10.0, delay=64, mu=0.05):
+    x = synthetic_speech(seconds, RATE)
+    short = x[:RATE // 4]
+    print(f"{seconds} s of audio at {RATE} Hz, delay D={delay}, mu={mu}")
+    print(f"{'order':>5} | {'adapting':>10} | {'frozen':>10} | {'reference':>10} | max diff to reference")
+    for order in ORDERS:
+        adapting = throughput(PredictiveDenoiser(order, delay, mu), x)
+        frozen = throughput(PredictiveDenoiser(order, delay, mu, freeze=True), x)
+
+        # validation: block size 1 is the sample by sample algorithm
+        t0 = time.perf_counter()
+        ref, w_ref = nlms_reference(short, order, delay, mu)
+        reference = len(short) / RATE / (time.perf_counter() - t0)
+        exact = PredictiveDenoiser(order, delay, mu, block_size=1)
+        diff = max(np.max(np.abs(exact.process(short) - ref)), np.max(np.abs(exact.w - w_ref)))
+        # with frozen weights, any block size gives the reference result
+        ref_frozen, _ = nlms_reference(short, order, delay, mu, freeze=True, w=w_ref)
+        frozen_check = PredictiveDenoiser(order, delay, mu, freeze=True)
+        frozen_check.w = w_ref.copy()
+        diff = max(diff, np.max(np.abs(frozen_check.process(short) - ref_frozen)))
+
+        print(f"{order:>5} | {adapting:>9.0f}x | {frozen:>9.0f}x | {reference:>9.2f}x | {diff:.2e}")
+        if diff > 1e-9:
+            sys.exit(1)
+
+    # stability over the mu range, with the default block size, against the reference
+    x = x[:2 * RATE]
+    print(f"order 32, {len(x) / RATE:.0f} s: block mode / reference")
+    print(f"{'mu':>5} | {'max |y|':>8} | {'error power':>11}")
+    for step in MU_RANGE:
+        y = PredictiveDenoiser(32, delay, step).process(x)
+        ref, _ = nlms_reference(x, 32, delay, step)
+        settled = slice(RATE // 4, None)  # after the first adaptation
+        peak = np.max(np.abs(y)) / np.max(np.abs(ref))
+        power = np.mean(np.square(x - y)[settled]) / np.mean(np.square(x - ref)[settled])
+        print(f"{step:>5} | {peak:>8.2f} | {power:>11.2f}")
+        if not np.all(np.isfinite(y)) or peak > PEAK_TOLERANCE or power > TOLERANCE:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark of the multi-channel DenoiserBank (predictive_denoiser.py) at 48 kHz: for N channels,
+the speed as multiple of real time, and the channels sustained in real time on one core
+(N times the real-time factor), against a loop over N single-channel PredictiveDenoisers.
+The audio is processed in blocks of --chunk-ms, like the buffers of an SDR program.
+Each channel of the bank has to give the same result as its single-channel denoiser.
+
+Execution (from the repository folder):
+python benchmarks/bench_denoiser_bank.py
+python benchmarks/bench_denoiser_bank.py --order 64 --channels 1,8,64 --frozen
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from generators import synthetic_speech
+from predictive_denoiser import DenoiserBank, PredictiveDenoiser
+
+RATE = 48000
+
+def channel_signals(n_channels, seconds):
+    """ Different speech-like signals with noise for each channel. """
+    rng = np.random.default_rng(1)
+    speech = synthetic_speech(seconds, RATE)
+    shifts = rng.integers(0, len(speech), n_channels)
+    return np.stack([np.roll(speech, shift) * rng.uniform(0.3, 1.0) + 0.05 * rng.standard_normal(len(speech))
+                     for shift in shifts])
+
+def realtime_factor(process, x, chunk):
+    """ Audio seconds per processing second, processing x in chunks of samples. """
+    t0 = time.perf_counter()
+    for start in range(0, x.shape[1], chunk):
+        process(x[:, start:start + chunk])
+    return x.shape[1] / RATE / (time.perf_counter() - t0)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the multi-channel denoiser bank at 48 kHz")
+    parser.add_argument("--channels", default="1,2,4,8,16,32,64,128", help="Numbers of channels N")
+    parser.add_argument("--order", type=int, default=32, help="Filter order M (default: 32)")
+    parser.add_argument("--delay", type=int, default=64, help="Prediction delay D (default: 64)")
+    parser.add_argument("--block-size", type=int, default=16, help="Samples per weight update (default: 16)")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Audio per channel (default: 2)")
+    parser.add_argument("--chunk-ms", type=float, default=100, help="Samples per call, in ms (default: 100)")
+    parser.add_argument("--frozen", action="store_true", help="Frozen weights instead of adapting")
+    args = parser.parse_args()
+    counts = [int(c) for c in args.channels.split(",")]
+    chunk = int(args.chunk_ms / 1000 * RATE)
+    x_all = channel_signals(max(counts), args.seconds)
+
+    print(f"{args.seconds} s per channel at {RATE} Hz, order {args.order}, delay {args.delay}, "
+          f"block size {args.block_size}, {'frozen' if args.frozen else 'adapting'}, chunks of {chunk} samples")
+    print(f"{'N':>5} | {'bank':>10} | {'sustained':>9} | {'loop':>10} | {'sustained':>9} | max diff")
+    best = 0.0
+    for n in counts:
+        x = x_all[:n]
+        bank = DenoiserBank(n, args.order, args.delay, 0.05, args.frozen, args.block_size)
+        singles = [PredictiveDenoiser(args.order, args.delay, 0.05, args.frozen, args.block_size) for _ in range(n)]
+        rng = np.random.default_rng(2)
+        if args.frozen:  # some weights, the same for the bank and the loop
+            bank.w = 0.02 * rng.standard_normal((n, bank.M))
+            for c, single in enumerate(singles):
+                single.w = bank.w[c].copy()
+        outputs = []
+        bank_rtf = realtime_factor(lambda block: outputs.append(bank.process(block)), x, chunk)
+        loop_outputs = []
+        loop_rtf = realtime_factor(lambda block: loop_outputs.append(
+            np.stack([single.process(block[c]) for c, single in enumerate(singles)])), x, chunk)
+        diff = np.max(np.abs(np.concatenate(outputs, axis=1) - np.concatenate(loop_outputs, axis=1)))
+        best = max(best, n * bank_rtf)
+        print(f"{n:>5} | {bank_rtf:>9.1f}x | {n * bank_rtf:>9.0f} | {loop_rtf:>9.1f}x | {n * loop_rtf:>9.0f} | {diff:.1e}")
+        if diff > 1e-9:
+            sys.exit(1)
+    print(f"up to about {best:.0f} channels in real time on one core with the bank")
+
+if __name__ == "__main__":
+    main()
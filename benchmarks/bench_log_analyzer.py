@@ -0,0 +1,65 @@
+"""
+Benchmark of log_analyzer.py on synthetic ADIF logs: QSOs per second with one process and with
+worker processes, and the peak heap memory for logs of different size, which should stay about constant.
+The statistics of the parallel run have to be identical to the single process.
+Uses dxcc.csv if present, otherwise the sample table fixtures/dxcc_sample.csv.
+
+Execution (from the repository folder):
+python benchmarks/bench_log_analyzer.py --qsos 200000 --workers 4
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from generators import dxcc_csv_path, write_synthetic_adif
+from log_analyzer import analyze_logs
+
+def peak_memory_mb(path):
+    """
+    Peak of the Python heap (tracemalloc) of a fresh process analyzing the log. The pages of the
+    memory-mapped file are not part of it, they can be dropped by the system at any time.
+    """
+    code = ("import sys, tracemalloc; sys.path.insert(0, %r); from log_analyzer import analyze_logs; "
+            "tracemalloc.start(); analyze_logs([%r], dxcc_path=%r); "
+            "print(tracemalloc.get_traced_memory()[1])") % (REPO_DIR, path, dxcc_csv_path())
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return int(output.split()[-1]) / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of log_analyzer.py")
+    parser.add_argument("--qsos", type=int, default=100000, help="QSOs of the largest log (default: 100000)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sizes = [args.qsos // 10, args.qsos]
+        paths = []
+        for n in sizes:
+            path = os.path.join(tmp, f"log_{n}.adi")
+            write_synthetic_adif(path, n)
+            paths.append(path)
+            print(f"{n} QSOs: {os.path.getsize(path) / 1e6:.1f} MB, peak heap {peak_memory_mb(path):.1f} MB")
+
+        path = paths[-1]
+        t0 = time.perf_counter()
+        serial = analyze_logs([path], dxcc_path=dxcc_csv_path())
+        t_serial = time.perf_counter() - t0
+        print(f"1 process: {args.qsos / t_serial:.0f} QSOs/s")
+        t0 = time.perf_counter()
+        parallel = analyze_logs([path], workers=args.workers, dxcc_path=dxcc_csv_path(), chunk_mb=1)
+        t_parallel = time.perf_counter() - t0
+        identical = parallel.to_dict() == serial.to_dict()
+        print(f"{args.workers} workers: {args.qsos / t_parallel:.0f} QSOs/s, "
+              f"speedup {t_serial / t_parallel:.1f}x, statistics identical: {identical}")
+        if not identical:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Benchmark of the call sign prefix lookup in hamRadioPrefix_offline.py: the ordered scan
+find_country_by_prefix (re.search for every row) against the precompiled PrefixMatcher.
+Both have to give the same entity for every call sign.
+It uses dxcc.csv if it was already downloaded by hamRadioPrefix_offline.py,
+otherwise the small sample table in fixtures/dxcc_sample.csv.
+
+Execution (from the repository folder):
+python benchmarks/bench_prefix_matcher.py
+"""
+
+import os
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from generators import dxcc_csv_path, random_callsigns
+from hamRadioPrefix_offline import PrefixMatcher, find_country_by_prefix, load_csv_data
+
+def main(n=20000):
+    data = load_csv_data(dxcc_csv_path())
+    print(f"{len(data)} DXCC rows from {dxcc_csv_path()}")
+
+    t0 = time.perf_counter()
+    matcher = PrefixMatcher(data)
+    t_build = time.perf_counter() - t0
+    print(f"PrefixMatcher built in {t_build * 1000:.1f} ms "
+          f"({'combined pattern' if matcher.combined is not None else 'fallback: ordered patterns'})")
+
+    calls = random_callsigns(n)
+    t0 = time.perf_counter()
+    scan = [find_country_by_prefix(data, call) for call in calls]
+    t_scan = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    matched = [matcher.find(call) for call in calls]
+    t_match = time.perf_counter() - t0
+
+    mismatches = sum(a != b for a, b in zip(scan, matched))
+    print(f"{n} call signs: scan {t_scan / n * 1e6:.1f} us/call, matcher {t_match / n * 1e6:.1f} us/call, "
+          f"speedup {t_scan / t_match:.1f}x, mismatches: {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
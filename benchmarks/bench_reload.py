@@ -0,0 +1,101 @@
+"""
+Benchmark of the hot reload of the DXCC table (data_reload.py): the duration of a full rebuild of
+the PrefixMatcher against the incremental ChunkedPrefixMatcher after one changed row, and the latency
+of the queries, which run in another thread, without reloads and with full or incremental reloads
+going on meanwhile (the reloads share the GIL with the queries, they slow them down but never stop them).
+
+Execution (from the repository folder):
+python benchmarks/bench_reload.py
+python benchmarks/bench_reload.py --rows 400 --reloads 20
+"""
+
+import argparse
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from generators import random_callsigns, write_synthetic_dxcc
+from data_reload import HotReloader
+from hamRadioPrefix_offline import build_matcher
+
+def reload_times(path, n_rows, reloads, incremental, first_edit=1):
+    """ Durations of the reloads in seconds, each after a change of one row. """
+    write_synthetic_dxcc(path, n_rows)
+    reloader = HotReloader(path, lambda p, previous: build_matcher(p, previous, incremental))
+    reloader.load()
+    times = []
+    for edit in range(first_edit, first_edit + reloads):
+        write_synthetic_dxcc(path, n_rows, edit)
+        while not reloader.check():  # the first check only sees the change, the second one reloads
+            pass
+        times.append(reloader.reload_seconds)
+    return times, reloader
+
+def query_latencies(reloader, calls, stop):
+    """ Latency of each lookup (in seconds) in a loop over calls, until stop is set. """
+    clock = time.perf_counter
+    latencies = []
+    while not stop.is_set():
+        for call in calls:
+            t0 = clock()
+            reloader.current.find(call)
+            latencies.append(clock() - t0)
+    return latencies
+
+def latency_summary(latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+    return (f"p50 {latencies[len(latencies) // 2] * 1e6:.1f} us, p99 {p99 * 1e6:.1f} us, "
+            f"max {latencies[-1] * 1000:.2f} ms over {len(latencies)} queries")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the hot reload of the DXCC table")
+    parser.add_argument("--rows", type=int, default=400, help="Rows of the synthetic table (default: 400)")
+    parser.add_argument("--reloads", type=int, default=10, help="Number of reloads (default: 10)")
+    args = parser.parse_args()
+    calls = random_callsigns(2000)
+
+    # without the "Reloaded ..." message of each reload
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stderr(open(os.devnull, "w")):
+        path = os.path.join(tmp, "dxcc.csv")
+        for incremental in (False, True):
+            # other edits for each variant, such that the re module cache does not help
+            times, reloader = reload_times(path, args.rows, args.reloads, incremental,
+                                           1 + incremental * args.reloads)
+            matcher = reloader.current
+            detail = f", {matcher.rebuilt} of {len(matcher.chunks)} chunks compiled" if incremental else ""
+            print(f"{'incremental' if incremental else 'full'} reload of {args.rows} rows: "
+                  f"median {statistics.median(times) * 1000:.1f} ms, max {max(times) * 1000:.1f} ms{detail}")
+
+        # queries in a thread, the reloads in the main thread (like the reload thread of the programs)
+        for mode in ("without reload", "during full reloads", "during incremental reloads"):
+            incremental = mode.endswith("incremental reloads")
+            reloader = HotReloader(path, lambda p, previous: build_matcher(p, previous, incremental))
+            reloader.load()
+            stop = threading.Event()
+            result = []
+            thread = threading.Thread(target=lambda: result.append(query_latencies(reloader, calls, stop)))
+            thread.start()
+            t_end = time.perf_counter() + 2.0
+            edit = 100 + 1000 * incremental
+            while time.perf_counter() < t_end:
+                if mode != "without reload":
+                    edit += 1
+                    write_synthetic_dxcc(path, args.rows, edit)
+                    while not reloader.check():
+                        pass
+                time.sleep(0.02)
+            stop.set()
+            thread.join()
+            print(f"queries {mode}: "
+                  f"{latency_summary(result[0])}, {reloader.version - 1} reloads")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark and check of the solar flux client in solarfluxdisp.py, without network access:
+a local HTTP server (tests/flux_server.py) serves the reconstruction of the page in
+fixtures/solarflux_sx-4-en.html, with ETag and Last-Modified, and answers conditional requests with 304.
+Compares the targeted parse with the full BeautifulSoup parse of the original program (if bs4
+is installed), and the times of a fresh fetch, a TTL cache hit and a revalidation.
+
+Execution (from the repository folder):
+python benchmarks/bench_solarflux.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "tests"))
+
+from flux_server import FIXTURE, FluxServer
+from solarfluxdisp import FluxHistory, SolarFluxClient, parse_flux_page
+
+def bs4_parse(html):
+    """ The parse of the original solarfluxdisp.py. """
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    content_section = soup.find(string=lambda string: string and "Flux Density Values in sfu" in string)
+    date_time_info = content_section.split('for')[1].strip()
+    date, time_ = date_time_info.split('at')
+    observed = soup.find(string="Observed Flux Density").find_next().string.strip()
+    return {"date": date.strip(), "time": time_.strip(), "flux": observed}
+
+def timed(func, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        result = func()
+    return (time.perf_counter() - t0) / n, result
+
+def main(n=200):
+    with open(FIXTURE, encoding="utf-8") as f:
+        html = f.read()
+    t_targeted, reading = timed(lambda: parse_flux_page(html), n)
+    print(f"targeted parse: {t_targeted * 1e6:.0f} us, {reading}")
+    try:
+        t_bs4, reference = timed(lambda: bs4_parse(html), n)
+        assert reading == reference, (reading, reference)
+        print(f"BeautifulSoup parse: {t_bs4 * 1e6:.0f} us, speedup {t_bs4 / t_targeted:.1f}x, identical")
+    except ImportError:
+        print("bs4 not installed, no comparison with the full parse")
+
+    server = FluxServer().start()
+    url = server.url
+    with tempfile.TemporaryDirectory() as tmp:
+        history = FluxHistory(os.path.join(tmp, "history.bin"))
+        cache_file = os.path.join(tmp, "solarflux.json")
+
+        def fetch(ttl, cold=False):
+            if cold and os.path.exists(cache_file):
+                os.remove(cache_file)
+            return SolarFluxClient(url, ttl, cache_file, history).get()
+
+        for label, ttl, cold in (("fetch without cache", 600, True), ("TTL cache hit", 600, False),
+                                 ("revalidation (304)", 0, False)):
+            t, result = timed(lambda: fetch(ttl, cold), 20)
+            print(f"{label}: {t * 1000:.2f} ms, source: {result['source']}")
+        print(f"server: {server.requests_200} full responses, {server.requests_304} not modified")
+        print(f"history (offline): {history.query()}")
+        assert history.query() == [(1710532800, 157.2)]
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
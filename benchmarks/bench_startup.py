@@ -0,0 +1,57 @@
+"""
+Startup times of the programs with the binary data cache (data_cache.py):
+cold (no cache, the CSV is parsed and the cache is written) and warm (the cache is loaded).
+Each start is a fresh Python process, which loads the data like the programs do. The city table
+is only loaded at the first query, hence the import alone is reported separately.
+For dxcc.csv, the sample table fixtures/dxcc_sample.csv is used, if dxcc.csv was not downloaded.
+
+Execution (from the repository folder):
+python benchmarks/bench_startup.py
+"""
+
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from data_cache import CACHE_DIR_NAME
+from generators import dxcc_csv_path
+
+PROGRAMS = {
+    # the city table is loaded lazily, at the first query: the import alone does not read it
+    "import qth_locator_distance_city (no data)": "import qth_locator_distance_city",
+    "large_cities.csv (import + first nearest_large_city)":
+        "from qth_locator_distance_city import nearest_large_city; nearest_large_city(50.68, 10.93)",
+    "dxcc.csv (load_cached + PrefixMatcher)":
+        "from data_cache import load_cached; from hamRadioPrefix_offline import load_csv_data, PrefixMatcher; "
+        f"PrefixMatcher(load_cached({dxcc_csv_path()!r}, load_csv_data))",
+}
+
+def run_once(code):
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, check=True)
+    return time.perf_counter() - t0
+
+def clear_caches():
+    for folder in {REPO_DIR, os.path.dirname(dxcc_csv_path())}:
+        shutil.rmtree(os.path.join(folder, CACHE_DIR_NAME), ignore_errors=True)
+
+def main(repeats=5):
+    baseline = statistics.median(run_once("pass") for _ in range(repeats))
+    print(f"Python interpreter alone: {baseline * 1000:.0f} ms")
+    for name, code in PROGRAMS.items():
+        cold = []
+        for _ in range(repeats):
+            clear_caches()
+            cold.append(run_once(code))
+        warm = [run_once(code) for _ in range(repeats)]
+        print(f"{name}: cold {statistics.median(cold) * 1000:.0f} ms, "
+              f"warm {statistics.median(warm) * 1000:.0f} ms (median of {repeats})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Synthetic test data for the benchmarks, all reproducible with a seed:
+random positions, valid locators and call signs, ADIF logs and speech-like audio,
+and the paths of the local fixtures, such that everything runs offline.
+"""
+
+import os
+import random
+
+from make_test_wav import synthetic_speech, to_int16  # noqa: F401 (re-exported for the benchmarks)
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(REPO_DIR, "fixtures")
+
+def dxcc_csv_path():
+    """ dxcc.csv if it was downloaded by hamRadioPrefix_offline.py, otherwise the sample table. """
+    if os.path.exists(os.path.join(REPO_DIR, "dxcc.csv")):
+        return os.path.join(REPO_DIR, "dxcc.csv")
+    return os.path.join(FIXTURES_DIR, "dxcc_sample.csv")
+
+def random_positions(n, seed=1):
+    rng = random.Random(seed)
+    return [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(n)]
+
+def random_locators(n, seed=1):
+    """ Random valid locators with mixed precision of 2, 4, 6 and 8 characters. """
+    rng = random.Random(seed)
+    fields = "ABCDEFGHIJKLMNOPQR"
+    subsquares = "abcdefghijklmnopqrstuvwx"
+    locators = []
+    for _ in range(n):
+        length = rng.choice((2, 4, 6, 8))
+        loc = rng.choice(fields) + rng.choice(fields)
+        if length >= 4:
+            loc += str(rng.randrange(10)) + str(rng.randrange(10))
+        if length >= 6:
+            loc += rng.choice(subsquares) + rng.choice(subsquares)
+        if length >= 8:
+            loc += str(rng.randrange(10)) + str(rng.randrange(10))
+        locators.append(loc)
+    return locators
+
+def random_callsigns(n, seed=1):
+    """ Call signs like DL5BBN, 2E0ABC, KH6XY, VP2EAB, or with portable suffixes like OE/DL1ABC/P. """
+    rng = random.Random(seed)
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    digits = "0123456789"
+    calls = []
+    for _ in range(n):
+        prefix = rng.choice(letters + digits) + rng.choice(letters)
+        if rng.random() < 0.3:
+            prefix = prefix[0]
+        call = prefix + rng.choice(digits) + "".join(rng.choice(letters) for _ in range(rng.randint(1, 3)))
+        r = rng.random()
+        if r < 0.05:
+            call += "/P"
+        elif r < 0.08:
+            call = rng.choice(("OE", "HB0", "EA8", "F")) + "/" + call
+        calls.append(call)
+    return calls
+
+ADIF_BANDS = [("160m", 1.83), ("80m", 3.55), ("40m", 7.02), ("30m", 10.12), ("20m", 14.025),
+              ("17m", 18.08), ("15m", 21.05), ("12m", 24.9), ("10m", 28.05), ("6m", 50.1), ("2m", 144.3)]
+
+def write_synthetic_adif(path, n_qsos, my_grid="JO62pl", seed=1, n_calls=20000):
+    """ ADIF log with n_qsos QSOs, drawn from n_calls different stations (with grids on 80% of the QSOs). """
+    rng = random.Random(seed)
+    calls = random_callsigns(n_calls, seed)
+    grids = random_locators(n_calls, seed)
+    def field(name, value):
+        return f"<{name}:{len(value)}>{value} "
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("Synthetic log\n<ADIF_VER:5>3.1.4 <EOH>\n")
+        for i in range(n_qsos):
+            station = rng.randrange(n_calls)
+            band, mhz = rng.choice(ADIF_BANDS)
+            record = field("CALL", calls[station])
+            if rng.random() < 0.8:
+                record += field("GRIDSQUARE", grids[station][:6])
+            record += (field("MY_GRIDSQUARE", my_grid) + field("BAND", band) + field("FREQ", f"{mhz:.3f}")
+                       + field("MODE", rng.choice(("CW", "SSB", "FT8"))) + field("QSO_DATE", f"2024{1 + i % 12:02d}15")
+                       + field("TIME_ON", f"{i % 24:02d}00"))
+            f.write(record + "<EOR>\n")
+
+def write_synthetic_dxcc(path, n_rows=400, edit=0):
+    """
+    DXCC table with the rows of dxcc_csv_path() and synthetic rows up to n_rows, about the size of
+    the real table. edit > 0 changes the name and prefix of one row (a different one per edit),
+    for the reload benchmarks. Returns the number of rows.
+    """
+    import csv
+    with open(dxcc_csv_path(), encoding="utf-8") as f:
+        header, *rows = list(csv.reader(f))
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    for i in range(max(0, n_rows - len(rows))):
+        prefix = "Q" + letters[i // 26 % 26] + letters[i % 26]
+        rows.append([prefix, f"Entity {prefix}", "EU", "1", "1", str(1000 + i), "false", "false", "false",
+                     "", "", "", "", "", f"^{prefix}[0-9]"])
+    if edit:
+        row = rows[edit * 37 % len(rows)]
+        row[1] = f"{row[1]} (edit {edit})"
+        row[14] = f"^E{edit}X|{row[14]}" if row[14] else f"^E{edit}X"
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows([header] + rows)
+    return len(rows)
@@ -0,0 +1,129 @@
+"""
+Load test of the lookup service (lookup_daemon.py): several connections send a mix of prefix,
+locator, distance and nearest city requests, each with up to --depth pipelined requests in flight,
+and the latency of each request (from sending until its answer arrived) is measured.
+Reports p50/p99 latency and the requests per second.
+
+By default, the service is started as a subprocess on a free port (with fixtures/dxcc_sample.csv
+if dxcc.csv was not downloaded). With --port, an already running service is tested.
+
+Execution (from the repository folder):
+python benchmarks/loadtest_daemon.py --connections 8 --depth 16 --requests 50000
+python benchmarks/loadtest_daemon.py --batch 100      # 100 requests per "batch" line
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from generators import dxcc_csv_path, random_callsigns, random_locators
+
+def request_mix(n, seed=1):
+    """ n random requests, half of them prefix lookups, like in spot traffic. """
+    rng = random.Random(seed)
+    calls = random_callsigns(n, seed)
+    locators = random_locators(n, seed)
+    requests = []
+    for i in range(n):
+        kind = rng.random()
+        if kind < 0.5:
+            requests.append({"op": "prefix", "call": calls[i]})
+        elif kind < 0.7:
+            requests.append({"op": "nearest", "locator": locators[i][:4], "popul": rng.choice((100000, 1000000))})
+        elif kind < 0.9:
+            requests.append({"op": "distance", "from": "JO62pl", "to": locators[i]})
+        else:
+            requests.append({"op": "locator", "locator": locators[i]})
+    return requests
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+async def run_connection(host, port, lines, depth, latencies):
+    """ Send the lines with at most depth unanswered lines in flight, collect the latencies. """
+    reader, writer = await asyncio.open_connection(host, port, limit=16 * 1024 * 1024)
+    window = asyncio.Semaphore(depth)
+    sent_times = []
+
+    async def receive():
+        # the answers come in the order of the lines, and each line was sent before its answer
+        for i in range(len(lines)):
+            answer = json.loads(await reader.readline())
+            if "error" in answer:
+                raise RuntimeError(answer["error"])
+            latencies.append(time.perf_counter() - sent_times[i])
+            window.release()
+
+    receiver = asyncio.create_task(receive())
+    for line in lines:
+        await window.acquire()
+        sent_times.append(time.perf_counter())
+        writer.write(line)
+        await writer.drain()
+    await receiver
+    writer.close()
+    await writer.wait_closed()
+
+async def load_test(host, port, requests, connections, depth, batch):
+    if batch > 1:
+        lines = [(json.dumps({"op": "batch", "requests": requests[i:i + batch]}) + "\n").encode()
+                 for i in range(0, len(requests), batch)]
+    else:
+        lines = [(json.dumps(r) + "\n").encode() for r in requests]
+    latencies = []
+    t0 = time.perf_counter()
+    await asyncio.gather(*(run_connection(host, port, lines[c::connections], depth, latencies)
+                           for c in range(connections)))
+    return time.perf_counter() - t0, sorted(latencies)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_daemon(port):
+    process = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, "lookup_daemon.py"), "--port", str(port),
+                                "--dxcc", dxcc_csv_path()], cwd=REPO_DIR, stdout=subprocess.PIPE, text=True)
+    print(process.stdout.readline().strip())  # waits until the service is listening
+    return process
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of lookup_daemon.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="Test a running service (default: start one)")
+    parser.add_argument("--connections", type=int, default=4, help="Number of connections (default: 4)")
+    parser.add_argument("--depth", type=int, default=16, help="Pipelined lines in flight per connection (default: 16)")
+    parser.add_argument("--requests", type=int, default=20000, help="Number of requests (default: 20000)")
+    parser.add_argument("--batch", type=int, default=1, help="Requests per line, >1: 'batch' requests (default: 1)")
+    args = parser.parse_args()
+
+    process = None
+    port = args.port
+    if port is None:
+        port = free_port()
+        process = start_daemon(port)
+    try:
+        requests = request_mix(args.requests)
+        elapsed, latencies = asyncio.run(load_test(args.host, port, requests, args.connections,
+                                                   args.depth, args.batch))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    per = f"per line of {args.batch} requests" if args.batch > 1 else "per request"
+    print(f"{args.requests} requests over {args.connections} connections, depth {args.depth}: "
+          f"{args.requests / elapsed:.0f} requests/s")
+    print(f"latency {per}: p50 {percentile(latencies, 50) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.2f} ms, max {latencies[-1] * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Generate synthetic test recordings as WAV files (mono, 16 bit), e.g. for the file mode of
+speech_to_text_offline.py, without a microphone. The signal imitates speech: voiced bursts with a
+harmonic spectrum and a slowly varying pitch, separated by pauses, plus white noise like on SSB.
+
+Execution (from the repository folder):
+python benchmarks/make_test_wav.py test.wav --seconds 60
+"""
+
+import argparse
+import wave
+
+import numpy as np
+
+def synthetic_speech(seconds, samplerate=16000, noise=0.05, seed=1):
+    """ Speech-like test signal as float array in the range -1..1. """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * samplerate)
+    t = np.arange(n) / samplerate
+    signal = np.zeros(n)
+    pos = 0
+    while pos < n:
+        # a "syllable" of 0.1-0.4 s, then a pause of 0.05-0.5 s
+        length = int(rng.uniform(0.1, 0.4) * samplerate)
+        seg = slice(pos, min(pos + length, n))
+        f0 = rng.uniform(90, 220) * (1 + 0.1 * np.sin(2 * np.pi * 3 * t[seg]))
+        phase = 2 * np.pi * np.cumsum(f0) / samplerate
+        burst = sum(np.sin(k * phase) / k for k in range(1, 12))
+        envelope = np.hanning(seg.stop - seg.start)
+        signal[seg] += 0.3 * envelope * burst
+        pos += length + int(rng.uniform(0.05, 0.5) * samplerate)
+    signal += noise * rng.standard_normal(n)
+    return np.clip(signal, -1.0, 1.0)
+
+def to_int16(signal):
+    return (np.clip(signal, -1.0, 1.0) * 32767).astype(np.int16)
+
+def write_wav(path, samples, samplerate=16000):
+    """ Write int16 samples as mono WAV file. """
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(samplerate)
+        wf.writeframes(np.ascontiguousarray(samples, dtype=np.int16).tobytes())
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic speech-like test WAV file")
+    parser.add_argument("path", help="Output WAV file")
+    parser.add_argument("--seconds", type=float, default=30.0, help="Duration (default: 30)")
+    parser.add_argument("--samplerate", type=int, default=16000, help="Sample rate (default: 16000)")
+    parser.add_argument("--noise", type=float, default=0.05, help="White noise amplitude (default: 0.05)")
+    args = parser.parse_args()
+    write_wav(args.path, to_int16(synthetic_speech(args.seconds, args.samplerate, args.noise)), args.samplerate)
+    print(f"Written {args.seconds} s to {args.path}")
+
+if __name__ == "__main__":
+    main()
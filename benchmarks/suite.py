@@ -0,0 +1,323 @@
+"""
+Benchmark suite over all programs: startup time (fresh Python process), single-query latency
+(p50/p99) and bulk throughput of the hot paths, with synthetic data (generators.py) and the local
+fixtures, hence it runs offline. The results are written as JSON, and can be compared with a stored
+baseline: a metric which got worse by more than the threshold counts as regression (exit code 1).
+Noisy metrics, the p99 latencies and the cold starts (file system), have a wider tolerance,
+a multiple of the threshold. The startup time is measured cold (without the binary data caches of
+data_cache.py, the CSV files are parsed) and warm, each as the median of several fresh processes.
+
+Execution (from the repository folder):
+python benchmarks/suite.py -o results.json
+python benchmarks/suite.py --baseline benchmarks/baseline.json --threshold 0.25
+python benchmarks/suite.py --only prefix,qth --quick
+python benchmarks/suite.py --save-baseline benchmarks/baseline.json   # after an intended change
+
+The baseline depends on the computer, create it on the computer where the suite is compared.
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from data_cache import CACHE_DIR_NAME
+from generators import (FIXTURES_DIR, dxcc_csv_path, random_callsigns, random_locators, random_positions,
+                        synthetic_speech, to_int16, write_synthetic_adif)
+
+#####################################
+# 1. MEASUREMENT HELPERS
+#####################################
+
+# Tolerance of the noisy metrics, as multiple of the threshold
+NOISY_TOLERANCE = 2.0
+
+class Results:
+    """
+    The metrics of a run: name -> {'value', 'unit', 'better': 'lower' or 'higher', 'tolerance'},
+    with tolerance the multiple of the threshold allowed for this metric.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.skipped = {}
+
+    def add(self, name, value, unit, better="lower", tolerance=1.0):
+        self.metrics[name] = {"value": value, "unit": unit, "better": better, "tolerance": tolerance}
+        print(f"  {name:<40} {value:12.4g} {unit}")
+
+    def add_latency(self, name, times_ns):
+        """ p50 and p99 of per-call times in nanoseconds, as microseconds. """
+        times = sorted(times_ns)
+        self.add(f"{name}.p50", times[len(times) // 2] / 1000, "us")
+        self.add(f"{name}.p99", times[min(len(times) - 1, len(times) * 99 // 100)] / 1000, "us",
+                 tolerance=NOISY_TOLERANCE)
+
+    def add_startup(self, name, code, cold=True):
+        """ Cold (if the program loads cached data tables) and warm startup time of code. """
+        if cold:
+            self.add(f"{name}.startup_cold", startup_seconds(code, cold=True), "s", tolerance=NOISY_TOLERANCE)
+        self.add(f"{name}.startup_warm", startup_seconds(code), "s")
+
+def call_times(func, inputs, repeat=3):
+    """
+    Time of each call func(x) for x in inputs, in nanoseconds, the fastest of repeat passes over
+    the inputs, which removes most of the noise of other processes.
+    Use repeat=1 for functions with caches, otherwise the later passes only measure cache hits.
+    """
+    clock = time.perf_counter_ns
+    best = None
+    for _ in range(repeat):
+        times = []
+        for x in inputs:
+            t0 = clock()
+            func(x)
+            times.append(clock() - t0)
+        best = times if best is None else [min(a, b) for a, b in zip(best, times)]
+    return best
+
+def rate(func, n):
+    """ Items per second of func(), which processes n items. """
+    t0 = time.perf_counter()
+    func()
+    return n / (time.perf_counter() - t0)
+
+def clear_data_caches():
+    """ Remove the binary caches of the CSV tables (not other files in .datacache, like the solar flux reading). """
+    for folder in {REPO_DIR, os.path.dirname(dxcc_csv_path())}:
+        for path in glob.glob(os.path.join(folder, CACHE_DIR_NAME, "*.csv.*.bin")):
+            os.remove(path)
+
+def startup_seconds(code, repeat=7, cold=False):
+    """
+    Median wall time of a fresh Python process running code. Warm: after one run to fill the data
+    caches. Cold: each run without the caches of the data tables, which are parsed from the CSV files.
+    """
+    run = [sys.executable, "-c", code]
+    if not cold:
+        subprocess.run(run, cwd=REPO_DIR, check=True, stdout=subprocess.DEVNULL)
+    times = []
+    for _ in range(repeat):
+        if cold:
+            clear_data_caches()
+        t0 = time.perf_counter()
+        subprocess.run(run, cwd=REPO_DIR, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+#####################################
+# 2. THE BENCHMARKS
+#####################################
+
+CASES = {}
+
+def case(name):
+    def register(func):
+        CASES[name] = func
+        return func
+    return register
+
+@case("qth")
+def bench_qth(results, scale):
+    import qth_locator_distance_city as qth
+    results.add_startup("qth", "import qth_locator_distance_city as q; q.nearest_large_city(52.5, 13.3)")
+    locators = random_locators(20000 // scale)
+    positions = random_positions(2000 // scale)
+    cities = qth.get_large_cities()
+    index = qth.get_city_index()
+    results.add_latency("qth.maidenhead_to_latlon", call_times(qth.maidenhead_to_latlon, locators))
+    results.add_latency("qth.haversine_km", call_times(lambda p: qth.haversine_km(52.5, 13.3, *p), positions))
+    results.add_latency("qth.find_nearest_large_city", call_times(
+        lambda p: qth.find_nearest_large_city(p[0], p[1], cities), positions[:200 // scale]))
+    results.add_latency("qth.nearest_indexed", call_times(lambda p: index.nearest(*p), positions))
+    many = random_locators(200000 // scale)
+    results.add("qth.maidenhead_to_latlon_batch.rate", rate(lambda: qth.maidenhead_to_latlon_batch(many), len(many)),
+                "locators/s", "higher")
+    results.add("qth.nearest_indexed.rate", rate(lambda: [index.nearest(*p) for p in positions], len(positions)),
+                "queries/s", "higher")
+
+@case("prefix")
+def bench_prefix(results, scale):
+    from hamRadioPrefix_offline import PrefixMatcher, find_country_by_prefix, load_csv_data, resolve_callsigns
+    results.add_startup("prefix",
+        "from data_cache import load_cached; from hamRadioPrefix_offline import load_csv_data, PrefixMatcher; "
+        f"PrefixMatcher(load_cached({dxcc_csv_path()!r}, load_csv_data)).find('DL1ABC')")
+    data = load_csv_data(dxcc_csv_path())
+    matcher = PrefixMatcher(data)
+    calls = random_callsigns(20000 // scale)
+    results.add_latency("prefix.find_country_by_prefix", call_times(
+        lambda c: find_country_by_prefix(data, c), calls[:2000 // scale]))
+    results.add_latency("prefix.matcher_find", call_times(matcher.find, calls))
+    results.add("prefix.resolve_callsigns.rate", rate(lambda: list(resolve_callsigns(calls, matcher)), len(calls)),
+                "calls/s", "higher")
+
+@case("solarflux")
+def bench_solarflux(results, scale):
+    from solarfluxdisp import FluxHistory, SolarFluxClient, parse_flux_page
+    page = os.path.join(FIXTURES_DIR, "solarflux_sx-4-en.html")
+    results.add_startup("solarflux",
+        f"import solarfluxdisp; solarfluxdisp.parse_flux_page(open({page!r}, encoding='utf-8').read())", cold=False)
+    with open(page, encoding="utf-8") as f:
+        html = f.read()
+    results.add_latency("solarflux.parse_flux_page", call_times(parse_flux_page, [html] * (200 // scale)))
+    with tempfile.TemporaryDirectory() as tmp:
+        # a fresh cached reading: get() is answered without network
+        cache_file = os.path.join(tmp, "solarflux.json")
+        client = SolarFluxClient("http://localhost/fixture", 600, cache_file, FluxHistory(os.path.join(tmp, "h.bin")))
+        client.store_cache({"url": client.url, "fetched": time.time(), "reading": parse_flux_page(html),
+                            "etag": None, "last_modified": None})
+        results.add_latency("solarflux.cache_hit", call_times(lambda _: client.get(), range(1000 // scale)))
+
+@case("denoiser")
+def bench_denoiser(results, scale):
+    from predictive_denoiser import PredictiveDenoiser
+    results.add_startup("denoiser", "import predictive_denoiser", cold=False)
+    x = synthetic_speech(10.0 / scale)
+    seconds = len(x) / 16000
+    results.add("denoiser.adapting.realtime", rate(lambda: PredictiveDenoiser(32, 64).process(x), seconds),
+                "x real time", "higher")
+    results.add("denoiser.frozen.realtime", rate(lambda: PredictiveDenoiser(32, 64, freeze=True).process(x), seconds),
+                "x real time", "higher")
+    # 16 SDR channels at 48 kHz, in blocks of 100 ms
+    from predictive_denoiser import DenoiserBank
+    bank = DenoiserBank(16, 32, 64)
+    channels = synthetic_speech(2.0 / scale, 48000)[None, :].repeat(16, axis=0)
+    results.add("denoiser.bank16_48k.channels_realtime", rate(
+        lambda: [bank.process(channels[:, i:i + 4800]) for i in range(0, channels.shape[1], 4800)],
+        16 * channels.shape[1] / 48000), "channels", "higher")
+
+@case("speech")
+def bench_speech(results, scale):
+    """ The capture path without recognizer (needs no model): ring buffer, optional denoiser, waveform. """
+    import speech_to_text_offline as stt
+    blocksize = 8000
+    audio = to_int16(synthetic_speech(40 * blocksize / 16000 / scale))
+    blocks = [audio[i:i + blocksize].tobytes() for i in range(0, len(audio) - blocksize + 1, blocksize)]
+    for name, denoise in (("speech.capture_block", None), ("speech.capture_block_denoise", stt.DenoiseStage())):
+        ring = stt.AudioRingBuffer(16, blocksize)
+
+        def one_block(data):
+            ring.callback(data, blocksize, None, None)
+            i = ring.get()
+            if denoise is not None:
+                denoise.process(ring.data(i))
+            stt.waveform(ring.data(i))
+            ring.release(i)
+        results.add_latency(name, call_times(one_block, blocks))
+
+@case("logs")
+def bench_logs(results, scale):
+    from log_analyzer import analyze_logs
+    n = 20000 // scale
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "log.adi")
+        write_synthetic_adif(path, n)
+        results.add("logs.analyze.rate", rate(lambda: analyze_logs([path], dxcc_path=dxcc_csv_path()), n),
+                    "QSOs/s", "higher")
+
+@case("daemon")
+def bench_daemon(results, scale):
+    """ The request handling of the lookup service, in process (without the socket). """
+    from lookup_daemon import LookupService
+    results.add_startup("daemon", f"from lookup_daemon import LookupService; LookupService({dxcc_csv_path()!r})")
+    service = LookupService(dxcc_csv_path())
+    calls = random_callsigns(5000 // scale)
+    locators = random_locators(5000 // scale)
+    results.add_latency("daemon.prefix", call_times(
+        service.handle_line, [json.dumps({"op": "prefix", "call": c}) for c in calls]))
+    # nearest is cached per locator (resolve_locator), hence only one pass
+    results.add_latency("daemon.nearest", call_times(
+        service.handle_line, [json.dumps({"op": "nearest", "locator": l}) for l in locators], repeat=1))
+
+@case("reload")
+def bench_reload(results, scale):
+    """ Hot reload of the DXCC table after one changed row, full and incremental (data_reload.py). """
+    from bench_reload import reload_times
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stderr(open(os.devnull, "w")):
+        for name, incremental in (("reload.dxcc_full", False), ("reload.dxcc_incremental", True)):
+            times, _ = reload_times(os.path.join(tmp, "dxcc.csv"), 400, 10 // scale, incremental,
+                                    1 + incremental * 100)
+            results.add(name, statistics.median(times) * 1000, "ms")
+
+#####################################
+# 3. RESULTS AND BASELINE
+#####################################
+
+def compare(metrics, baseline, threshold):
+    """ Print the changes against the baseline, returns the names of the regressions. """
+    regressions = []
+    print(f"\n{'metric':<40} {'baseline':>12} {'now':>12} {'change':>8} {'allowed':>8}")
+    for name, now in metrics.items():
+        base = baseline.get(name)
+        if base is None or not base["value"] or not now["value"]:
+            continue
+        # factor by which it got worse (>1) or better (<1)
+        if now["better"] == "lower":
+            worse = now["value"] / base["value"]
+        else:
+            worse = base["value"] / now["value"]
+        allowed = threshold * now.get("tolerance", 1.0)
+        flag = ""
+        if worse > 1 + allowed:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<40} {base['value']:12.4g} {now['value']:12.4g} {(worse - 1) * 100:+7.0f}% "
+              f"{allowed * 100:+7.0f}%{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite of the amateur radio programs")
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file")
+    parser.add_argument("--only", help=f"Comma separated benchmarks (default: all of {','.join(CASES)})")
+    parser.add_argument("--quick", action="store_true", help="Smaller data, for a fast check")
+    parser.add_argument("--baseline", help="Compare with the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown against the baseline, 0.25 = 25%% (default: 0.25), "
+                             f"{NOISY_TOLERANCE:g} times that for p99 latencies and cold starts")
+    parser.add_argument("--save-baseline", metavar="FILE", help="Store the results as new baseline")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(CASES)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    scale = 10 if args.quick else 1
+    results = Results()
+    for name in names:
+        print(f"{name}:")
+        try:
+            CASES[name](results, scale)
+        except ImportError as e:  # e.g. vosk or NumPy not installed
+            results.skipped[name] = str(e)
+            print(f"  skipped: {e}")
+
+    report = {"meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                       "platform": platform.platform(), "cpus": os.cpu_count(), "quick": args.quick},
+              "metrics": results.metrics, "skipped": results.skipped}
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("quick") != args.quick:
+            print("\nNote: the baseline was measured with a different --quick setting")
+        regressions = compare(results.metrics, baseline["metrics"], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold * 100:.0f}%: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions.")
+
+if __name__ == "__main__":
+    main()
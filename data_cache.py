@@ -0,0 +1,80 @@
+"""
+Binary cache for the data tables (large_cities.csv, dxcc.csv), for a fast start of the programs.
+On the first load, the table is parsed as usual, and the result (plain lists, tuples, strings
+and numbers) is stored with the marshal module in the folder .datacache next to the CSV file.
+Later starts load this binary file instead of parsing the CSV again, which is several times faster.
+The cache is invalidated when the CSV file changes (size and modification time, and if only the
+modification time changed, e.g. after downloading the same table again, its SHA-256 hash),
+when the parse function changes its version, or with a different Python version.
+
+Usage:
+data = load_cached("dxcc.csv", load_csv_data)
+"""
+
+import hashlib
+import marshal
+import os
+import sys
+
+CACHE_DIR_NAME = ".datacache"
+# Increase if the layout of the cache files changes
+CACHE_FORMAT = 1
+
+def cache_path(csv_path, parse):
+    folder = os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIR_NAME)
+    return os.path.join(folder, f"{os.path.basename(csv_path)}.{parse.__name__}.bin")
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_cached(csv_path, parse, version=1, use_cache=True):
+    """
+    Return parse(csv_path), from the binary cache if it is up to date,
+    otherwise parse the CSV file and store the result in the cache.
+    The result of parse has to consist of types supported by marshal
+    (lists, tuples, dicts, strings, numbers, None).
+    version: increase it when parse changes what it returns.
+    """
+    if not use_cache or not os.path.exists(csv_path):
+        return parse(csv_path)
+    key = (CACHE_FORMAT, tuple(sys.version_info[:2]), parse.__name__, version)
+    st = os.stat(csv_path)
+    path = cache_path(csv_path, parse)
+    try:
+        with open(path, 'rb') as f:
+            cached_key, mtime_ns, size, digest, data = marshal.loads(f.read())
+        if cached_key == key and size == st.st_size:
+            if mtime_ns == st.st_mtime_ns:
+                return data
+            # Touched or downloaded again (like dxcc.csv on every start): compare the content
+            if digest == _file_hash(csv_path):
+                store_cache(path, (key, st.st_mtime_ns, st.st_size, digest, data))
+                return data
+    except (OSError, EOFError, ValueError, TypeError):
+        pass  # no or unreadable cache, parse the CSV
+    digest = _file_hash(csv_path)
+    data = parse(csv_path)
+    store_cache(path, (key, st.st_mtime_ns, st.st_size, digest, data))
+    return data
+
+def store_cache(path, content):
+    """ Write the cache file atomically, such that a concurrent start never reads half a file. """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(marshal.dumps(content))
+        os.replace(tmp_path, path)
+    except (OSError, ValueError):
+        # e.g. a read-only folder, or data which marshal cannot store: just run without cache
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+def clear_cache(csv_path, parse):
+    try:
+        os.remove(cache_path(csv_path, parse))
+    except OSError:
+        pass
@@ -0,0 +1,130 @@
+"""
+Hot reload of the data tables (dxcc.csv, large_cities.csv) for long-running programs, like the
+interactive loops and lookup_daemon.py. A background thread checks the modification time and size
+of the file every few seconds. When they changed, and stayed the same for one more check (such that
+a download in progress is not read half written), and the content (SHA-256) is really new, the lookup
+structure is built again in the background thread, while the queries keep using the old one.
+Then the new structure is swapped in with one assignment. A query takes reloader.current once and
+uses it to the end, hence it sees either the old or the new table, never a half-built one.
+If the new file cannot be loaded, the old table stays in use.
+
+Usage:
+reloader = HotReloader("dxcc.csv", build_matcher)   # build(path, previous) -> lookup structure
+reloader.start()
+matcher = reloader.current                            # per query
+reloader.info()                                       # data version, reload duration, ...
+"""
+
+import hashlib
+import os
+import sys
+import threading
+import time
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+class HotReloader:
+    """
+    Keeps the lookup structure built by build(path, previous) from the file path up to date.
+    previous is the structure in use (None at the first load), for incremental rebuilds.
+    on_swap(reloader) is called after each new version was swapped in.
+    """
+
+    def __init__(self, path, build, interval=2.0, on_swap=None):
+        self.path = path
+        self.build = build
+        self.interval = interval
+        self.on_swap = on_swap
+        self.current = None
+        self.version = 0  # increased with each loaded content
+        self.digest = None
+        self.loaded_at = None
+        self.reload_seconds = 0.0  # duration of the last (re)load
+        self.last_error = None
+        self._stat = None  # (mtime, size) of the loaded file
+        self._seen = None  # (mtime, size) at the last check
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _file_stat(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def load(self):
+        """ Build the structure now (at the start), errors are raised. Returns the structure. """
+        with self._lock:
+            stat = self._file_stat()
+            t0 = time.perf_counter()
+            digest = file_hash(self.path)
+            self._swap(self.build(self.path, None), stat, digest, t0)
+        return self.current
+
+    def check(self):
+        """ Reload if the file changed since the last load. Returns True if a new version was swapped in. """
+        with self._lock:
+            try:
+                stat = self._file_stat()
+            except OSError:  # deleted, or being replaced
+                return False
+            if stat == self._stat or stat != self._seen:
+                # unchanged, or changed since the last check, then maybe still being written
+                self._seen = stat
+                return False
+            t0 = time.perf_counter()
+            try:
+                digest = file_hash(self.path)
+                if digest == self.digest:  # same content, e.g. downloaded again
+                    self._stat = stat
+                    return False
+                new = self.build(self.path, self.current)
+            except Exception as e:  # keep the old table, try again when the file changes again
+                self._stat = stat
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Reload of {self.path} failed, keeping version {self.version}: {self.last_error}",
+                      file=sys.stderr)
+                return False
+            self._swap(new, stat, digest, t0)
+            print(f"Reloaded {self.path}: version {self.version} in {self.reload_seconds * 1000:.0f} ms",
+                  file=sys.stderr)
+            return True
+
+    def _swap(self, new, stat, digest, t0):
+        self.current = new  # the atomic swap
+        self._stat = self._seen = stat
+        self.digest = digest
+        self.version += 1
+        self.loaded_at = time.time()
+        self.reload_seconds = time.perf_counter() - t0
+        self.last_error = None
+        if self.on_swap is not None:
+            self.on_swap(self)
+
+    def info(self):
+        """ Data version and reload statistics, for status output. """
+        return {"path": self.path, "version": self.version,
+                "sha256": self.digest[:16] if self.digest else None,
+                "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.loaded_at)) if self.loaded_at else None,
+                "reload_ms": round(self.reload_seconds * 1000, 1),
+                "watching": self._thread is not None, "last_error": self.last_error}
+
+    def start(self):
+        """ Load the structure (if not done yet), and check the file every interval seconds in a thread. """
+        if self.current is None:
+            self.load()
+        self._thread = threading.Thread(target=self._run, name=f"HotReloader-{os.path.basename(self.path)}",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.check()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -14,6 +14,7 @@ import requests
 import re
 import csv
 #import sys
+from hamRadioPrefix_offline import PrefixMatcher
 
 # URL to the CSV file
 csv_url = 'https://raw.githubusercontent.com/k0swe/dxcc-json/main/dxcc-2020-02.csv'
@@ -45,9 +46,10 @@ def find_country_by_prefix(data, prefix):
 
 def main():
     data = fetch_csv_data(csv_url)
+    matcher = PrefixMatcher(data)
     
     prefix_input = input("Enter call sign prefix: ").upper()
-    result = find_country_by_prefix(data, prefix_input)
+    result = matcher.find(prefix_input)
     
     if result:
         print(f"Name: {result['name']}, Continent: {result['continent']}, ITU: {result['itu']}, CQ: {result['cq']}, Flag: {result['flag']}")
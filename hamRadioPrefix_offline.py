@@ -13,11 +13,19 @@ Make it offline capable
 Gerald Schuller, April 2024
 """
 
-import requests
 import re
 import csv
 import os
-#import sys
+import sys
+import json
+import argparse
+import contextlib
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from data_cache import load_cached
+from instrumentation import timed
 
 # URL to the CSV file
 csv_url = 'https://raw.githubusercontent.com/k0swe/dxcc-json/main/dxcc-2020-02.csv'
@@ -25,6 +33,8 @@ csv_url = 'https://raw.githubusercontent.com/k0swe/dxcc-json/main/dxcc-2020-02.c
 local_csv_path = 'dxcc.csv'
 
 def fetch_and_store_csv_data(url, local_path):
+    # Imported only here, since it takes longer than loading the (cached) table
+    import requests
     try:
         # Attempt to fetch the CSV data
         response = requests.get(url)
@@ -38,6 +48,7 @@ def fetch_and_store_csv_data(url, local_path):
     except Exception as e:
         print(f"Failed to fetch CSV data: {e}. Using local data if available.")
 
+@timed("prefix.load_csv_data")
 def load_csv_data(local_path):
     # Check if the file exists locally
     if not os.path.exists(local_path):
@@ -52,6 +63,7 @@ def load_csv_data(local_path):
         return data_lines[1:]  # Adjust indexing based on your needs
 
 
+@timed("prefix.find_country_by_prefix")
 def find_country_by_prefix(data, prefix):
     for row in data:
         # Assuming the columns are as follows: 
@@ -69,13 +81,259 @@ def find_country_by_prefix(data, prefix):
             }
     return None
 
+class PrefixMatcher:
+    """
+    Precompiled version of find_country_by_prefix, built once after loading the CSV data.
+    All prefix regular expressions are combined into one compiled alternation, where
+    alternative i is a lookahead (?=.*?regex_i) at the start of the call sign, in a named group.
+    The regex engine tries the alternatives in the order of the rows, hence the first matching
+    group is the same entity as the first match of the ordered scan in find_country_by_prefix,
+    but the whole search runs in one call of the compiled pattern.
+    If the regular expressions cannot be combined (e.g. because of back references),
+    the individually precompiled expressions are tried in order instead.
+    """
+
+    def __init__(self, data):
+        self.results = []
+        regexes = []
+        for row in data:
+            _, name, continent, itu, cq, _, _, _, _, _, _, _, _, flag, prefix_regex = row
+            if prefix_regex=="":
+               prefix_regex="_" #Avoid identifying empty string as prefix
+            regexes.append(prefix_regex)
+            self.results.append({
+                'name': name,
+                'continent': continent,
+                'itu': itu,
+                'cq': cq,
+                'flag': flag
+            })
+        # Individually compiled patterns, as fallback
+        self.patterns = [re.compile(regex, re.IGNORECASE) for regex in regexes]
+        self.combined = None
+        if any(p.groups for p in self.patterns):
+            # Group numbers would shift in the combined pattern, which breaks back references
+            if any(re.search(r'\\[1-9]|\(\?P=|\(\?\(', regex) for regex in regexes):
+                return
+        alternatives = []
+        for i, regex in enumerate(regexes):
+            # Anchored expressions (without alternatives) only need to be tried at the start
+            if regex.startswith('^') and '|' not in regex:
+                lookahead = f"(?={regex})"
+            else:
+                lookahead = f"(?=[\\s\\S]*?(?:{regex}))"
+            alternatives.append(f"(?P<r{i}>{lookahead})")
+        try:
+            self.combined = re.compile("|".join(alternatives), re.IGNORECASE)
+        except re.error:
+            self.combined = None
+
+    @timed("prefix.matcher_find")
+    def find(self, prefix):
+        """ Same result as find_country_by_prefix(data, prefix). """
+        if self.combined is not None:
+            match = self.combined.match(prefix)
+            if match is None:
+                return None
+            return dict(self.results[int(match.lastgroup[1:])])
+        for i, pattern in enumerate(self.patterns):
+            if pattern.search(prefix):
+                return dict(self.results[i])
+        return None
+
+class ChunkedPrefixMatcher:
+    """
+    PrefixMatcher split into chunks of consecutive rows, for the incremental reload of the table
+    (see data_reload.py): the matcher of a new table reuses the compiled chunks of the previous
+    matcher whose rows did not change, and compiles only the changed chunks again.
+    A chunk ends after each row whose regex has a CRC-32 divisible by chunk_rows, hence the
+    boundaries depend on the content of the rows, not on their position, and an inserted or
+    deleted row only changes its own chunk. The chunks are tried in order, hence the result
+    is the same as of PrefixMatcher.
+    """
+
+    def __init__(self, data, previous=None, chunk_rows=32):
+        reusable = previous.chunk_by_rows if previous is not None else {}
+        self.chunks = []
+        self.chunk_by_rows = {}
+        self.rebuilt = 0  # number of chunks compiled for this table
+        rows = []
+        for row in data:
+            rows.append(tuple(row))
+            if zlib.crc32(row[-1].encode('utf-8')) % chunk_rows == 0:
+                self._add_chunk(tuple(rows), reusable)
+                rows = []
+        if rows:
+            self._add_chunk(tuple(rows), reusable)
+
+    def _add_chunk(self, rows, reusable):
+        matcher = reusable.get(rows)
+        if matcher is None:
+            matcher = PrefixMatcher(rows)
+            self.rebuilt += 1
+        self.chunk_by_rows[rows] = matcher
+        self.chunks.append(matcher)
+
+    @timed("prefix.chunked_matcher_find")
+    def find(self, prefix):
+        """ Same result as find_country_by_prefix(data, prefix). """
+        for chunk in self.chunks:
+            result = chunk.find(prefix)
+            if result is not None:
+                return result
+        return None
+
+def build_matcher(local_path, previous=None, incremental=False):
+    """
+    The matcher for the table local_path, as build function of data_reload.HotReloader.
+    incremental: a ChunkedPrefixMatcher, which reuses the unchanged chunks of previous.
+    """
+    data = load_cached(local_path, load_csv_data)
+    if not data:
+        raise ValueError(f"no prefix data in {local_path}")
+    if incremental:
+        return ChunkedPrefixMatcher(data, previous if isinstance(previous, ChunkedPrefixMatcher) else None)
+    return PrefixMatcher(data)
+
+############################################################
+# BATCH MODE: CALL SIGNS FROM FILES OR STDIN
+############################################################
+
+OUTPUT_FIELDS = ['call', 'name', 'continent', 'itu', 'cq']
+
+def read_callsigns(paths, column=0):
+    """
+    Generator of the call signs in the text files given in paths ('-' or no paths: stdin).
+    Each non-empty line is split at white space or commas, and the token with the index column
+    is the call sign (e.g. column=4 for the DX call in 'DX de DL1ABC: 14025.0 K1XYZ ...').
+    """
+    for path in paths or ['-']:
+        f = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8', errors='replace')
+        try:
+            for line in f:
+                tokens = line.replace(',', ' ').split()
+                if len(tokens) > column:
+                    yield tokens[column].upper()
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+def resolve_callsigns(calls, matcher):
+    """ Generator of output records (dicts with OUTPUT_FIELDS) for the call signs. """
+    for call in calls:
+        result = matcher.find(call) or {}
+        yield {'call': call, 'name': result.get('name', ''), 'continent': result.get('continent', ''),
+               'itu': result.get('itu', ''), 'cq': result.get('cq', '')}
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+# The matcher of each worker process, built once by _init_worker
+_worker_matcher = None
+
+def _init_worker(local_path):
+    global _worker_matcher
+    _worker_matcher = PrefixMatcher(load_cached(local_path, load_csv_data))
+
+def _resolve_chunk(calls):
+    return list(resolve_callsigns(calls, _worker_matcher))
+
+def resolve_callsigns_parallel(calls, local_path, workers, chunk_size=5000):
+    """
+    Like resolve_callsigns, but spread over a pool of worker processes, in chunks of call signs.
+    At most 2 chunks per worker are in flight, hence the memory stays constant,
+    and the records come out in the input order.
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(local_path,)) as pool:
+        pending = deque()
+        for chunk in chunked(calls, chunk_size):
+            pending.append(pool.submit(_resolve_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def write_records(records, out, fmt='csv'):
+    """ Write the records as CSV (with header) or as JSON lines. Returns the number of records. """
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=OUTPUT_FIELDS, lineterminator='\n')
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            count += 1
+    else:
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+def batch_main(args):
+    # Messages go to stderr, such that stdout can carry the records
+    if not os.path.exists(local_csv_path):
+        with contextlib.redirect_stdout(sys.stderr):
+            fetch_and_store_csv_data(csv_url, local_csv_path)
+    with contextlib.redirect_stdout(sys.stderr):
+        data = load_cached(local_csv_path, load_csv_data)
+    if not data:
+        sys.exit(1)
+
+    calls = read_callsigns(args.files, args.column)
+    if args.workers > 1:
+        records = resolve_callsigns_parallel(calls, local_csv_path, args.workers)
+    else:
+        records = resolve_callsigns(calls, PrefixMatcher(data))
+
+    if args.output and args.output != '-':
+        with open(args.output, 'w', encoding='utf-8', newline='') as out:
+            count = write_records(records, out, args.format)
+    else:
+        count = write_records(records, sys.stdout, args.format)
+    print(f"{count} call signs resolved.", file=sys.stderr)
+
 def main():
+    parser = argparse.ArgumentParser(description="Call sign prefix lookup (DXCC entity, continent, ITU and CQ zone)")
+    parser.add_argument("files", nargs="*",
+                        help="Batch mode: text files with one call sign per line ('-' for stdin)")
+    parser.add_argument("-b", "--batch", action="store_true",
+                        help="Batch mode, also without files: read the call signs from stdin")
+    parser.add_argument("-c", "--column", type=int, default=0,
+                        help="Index of the call sign among the words of a line (default: 0)")
+    parser.add_argument("-f", "--format", choices=["csv", "jsonl"], default="csv",
+                        help="Output format of the batch mode (default: csv)")
+    parser.add_argument("-o", "--output", help="Output file of the batch mode (default: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Number of worker processes for the batch mode (default: 1)")
+    parser.add_argument("--reload", type=float, nargs="?", const=2.0, metavar="SECONDS",
+                        help="Reload dxcc.csv when it changes, checked every SECONDS (default: 2)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="With --reload: recompile only the changed parts of the prefix table")
+    args = parser.parse_args()
+    if args.batch or args.files:
+        batch_main(args)
+        return
+
     fetch_and_store_csv_data(csv_url, local_csv_path)
-    data = load_csv_data(local_csv_path)
-    
+    if args.reload:
+        # the table is rebuilt in the background when dxcc.csv changes, see data_reload.py
+        from data_reload import HotReloader
+        reloader = HotReloader(local_csv_path, lambda path, previous: build_matcher(path, previous, args.incremental),
+                               args.reload).start()
+    else:
+        data = load_cached(local_csv_path, load_csv_data)
+        matcher = PrefixMatcher(data)
+
     while True: #infinite loop for input, end with ctrl-C
        prefix_input = input("Enter call sign prefix: ").upper()
-       result = find_country_by_prefix(data, prefix_input)
+       if args.reload:
+           matcher = reloader.current
+       result = matcher.find(prefix_input)
        
        if result:
            print(f"Name: {result['name']}, Continent: {result['continent']}, ITU: {result['itu']}, CQ: {result['cq']}, Flag: {result['flag']}")
@@ -0,0 +1,218 @@
+"""
+Lightweight metrics for the hot paths of the programs: counters, and histograms of durations (timers).
+It is switched on with environment variables, before the program starts, and costs nothing when it is
+off: the @timed decorator then returns the undecorated function, and inline measurements are guarded
+by "if instrumentation.ENABLED".
+
+  HAMRADIO_METRICS=metrics.json   collect the metrics and write them at exit, as JSON, or in the
+                                  Prometheus text format if the file name ends with .prom.
+                                  With kill -USR1 <pid>, the file is written at any time.
+  HAMRADIO_PROFILE=run.prof       run the program under cProfile, and write the statistics at exit
+                                  (show them with: python -m pstats run.prof)
+  HAMRADIO_SAMPLE=stacks.txt      sampling profiler: every HAMRADIO_SAMPLE_MS milliseconds (default 5),
+                                  the stacks of all threads are recorded, and written at exit in the
+                                  collapsed format of flamegraph.pl (one line per stack with its count)
+
+Worker processes of multiprocessing (e.g. ProcessPoolExecutor with the spawn start method) import this
+module again and write their own files, with the process id before the extension (metrics.12345.json),
+such that they do not overwrite the file of the main program.
+
+Example:
+HAMRADIO_METRICS=metrics.prom python speech_to_text_offline.py -f qso.wav
+"""
+
+import atexit
+import bisect
+import functools
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+METRICS_PATH = os.environ.get("HAMRADIO_METRICS", "")
+PROFILE_PATH = os.environ.get("HAMRADIO_PROFILE", "")
+SAMPLE_PATH = os.environ.get("HAMRADIO_SAMPLE", "")
+ENABLED = bool(METRICS_PATH)
+
+# Upper bounds of the histogram buckets in seconds, 1 us .. 10 s
+BUCKETS = (1e-6, 1e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+
+class Counter:
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self.lock:
+            self.value += n
+
+class Histogram:
+    """ Distribution of durations in seconds, with the bucket counts of BUCKETS (and above). """
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect.bisect_left(BUCKETS, seconds)
+        with self.lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += seconds
+            self.min = min(self.min, seconds)
+            self.max = max(self.max, seconds)
+
+    def snapshot(self):
+        with self.lock:
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip(BUCKETS + ("+Inf",), self.counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            return {"count": self.count, "sum": self.sum, "min": self.min if self.count else 0.0,
+                    "max": self.max, "mean": self.sum / self.count if self.count else 0.0, "buckets": buckets}
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+def _get(name, cls):
+    metric = _metrics.get(name)
+    if metric is None:
+        with _metrics_lock:
+            metric = _metrics.setdefault(name, cls(name))
+    return metric
+
+def counter(name):
+    return _get(name, Counter)
+
+def histogram(name):
+    return _get(name, Histogram)
+
+def timed(name):
+    """
+    Decorator, which records the duration of each call in the histogram name.
+    Without HAMRADIO_METRICS, the function is returned unchanged.
+    """
+    def decorate(func):
+        if not ENABLED:
+            return func
+        hist = histogram(name)
+        clock = time.perf_counter
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            t0 = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                hist.observe(clock() - t0)
+        return wrapper
+    return decorate
+
+def observe(name, seconds):
+    """ For inline measurements, call only inside 'if instrumentation.ENABLED:'. """
+    histogram(name).observe(seconds)
+
+def snapshot():
+    """ All metrics as dict: {'counters': {name: value}, 'histograms': {name: {...}}}. """
+    with _metrics_lock:
+        metrics = list(_metrics.values())
+    return {"time": time.time(), "program": os.path.basename(sys.argv[0]),
+            "counters": {m.name: m.value for m in metrics if isinstance(m, Counter)},
+            "histograms": {m.name: m.snapshot() for m in metrics if isinstance(m, Histogram)}}
+
+def _prometheus_name(name):
+    return "hamradio_" + "".join(c if c.isalnum() else "_" for c in name)
+
+def to_prometheus(snap=None):
+    """ The metrics in the Prometheus text exposition format. """
+    snap = snap or snapshot()
+    lines = []
+    for name, value in sorted(snap["counters"].items()):
+        metric = _prometheus_name(name) + "_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    for name, hist in sorted(snap["histograms"].items()):
+        metric = _prometheus_name(name) + "_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        lines += [f'{metric}_bucket{{le="{bound}"}} {count}' for bound, count in hist["buckets"].items()]
+        lines += [f"{metric}_sum {hist['sum']!r}", f"{metric}_count {hist['count']}"]
+    return "\n".join(lines) + "\n"
+
+def process_path(path):
+    """ path in the main process, with the process id before the extension in worker processes. """
+    from multiprocessing import parent_process
+    if not path or parent_process() is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{os.getpid()}{ext}"
+
+def export(path=None):
+    """ Write the metrics to path (default: HAMRADIO_METRICS, see process_path), atomically. """
+    path = path or process_path(METRICS_PATH)
+    if not path:
+        return
+    snap = snapshot()
+    text = to_prometheus(snap) if path.endswith(".prom") else json.dumps(snap, indent=1)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+#####################################
+# PROFILING
+#####################################
+
+class StackSampler(threading.Thread):
+    """ Records the stacks of all other threads every interval seconds, counted per stack. """
+
+    def __init__(self, interval=0.005):
+        super().__init__(name="StackSampler", daemon=True)
+        self.interval = interval
+        self.stacks = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def write(self, path):
+        self.stopped.set()
+        self.join()
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+
+def _start():
+    if ENABLED:
+        atexit.register(export)
+        if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, lambda signum, frame: export())
+    if PROFILE_PATH:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        atexit.register(lambda: (profiler.disable(), profiler.dump_stats(process_path(PROFILE_PATH))))
+    if SAMPLE_PATH:
+        sampler = StackSampler(float(os.environ.get("HAMRADIO_SAMPLE_MS", "5")) / 1000)
+        sampler.start()
+        atexit.register(lambda: sampler.write(process_path(SAMPLE_PATH)))
+
+_start()
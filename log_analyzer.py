@@ -0,0 +1,401 @@
+"""
+Statistics over amateur radio logs in ADIF (.adi) or Cabrillo (.cbr, .log) format, e.g. all logs of
+several years with millions of QSOs: QSOs per DXCC entity, CQ and ITU zone, per grid square and per
+nearest large city, a histogram of the distances, and the longest QSO per band.
+
+The call signs are resolved with the prefix table of hamRadioPrefix_offline.py (PrefixMatcher, same
+result as find_country_by_prefix), the locators with maidenhead_to_latlon, haversine_km and the
+nearest city search of qth_locator_distance_city.py, both with LRU caches, since calls and grid
+squares repeat a lot in logs.
+The log files are memory-mapped and read record by record, and the statistics are updated with each
+record, hence the memory stays constant, independent of the size of the logs. With -w, the files
+are split into chunks at record boundaries, which are analyzed in parallel worker processes, and
+their statistics are merged (with the same result as a single process).
+
+The distances need the own locator: MY_GRIDSQUARE of the ADIF records, the grid in the sent exchange
+or GRID-LOCATOR of the Cabrillo header, or --my-grid.
+
+Execution:
+python log_analyzer.py my_log_2020-2025.adi contest.cbr --my-grid JO62pl -w 4
+"""
+
+import argparse
+import json
+import mmap
+import os
+import re
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from data_cache import load_cached
+from hamRadioPrefix_offline import PrefixMatcher, load_csv_data, local_csv_path
+from qth_locator_distance_city import (LRUCache, haversine_km, maidenhead_to_latlon, resolve_locator,
+                                       set_data_path)
+
+#####################################
+# 1. READING ADIF AND CABRILLO
+#####################################
+
+ADIF_TAG = re.compile(rb"<([A-Za-z0-9_]+)(?::(\d+)(?::[A-Za-z])?)?>")
+ADIF_EOR = re.compile(rb"<eor>", re.IGNORECASE)
+CABRILLO_QSO = re.compile(rb"^QSO:[ \t]*(.*?)\r?$", re.MULTILINE)
+CABRILLO_GRID = re.compile(rb"^GRID-LOCATOR:[ \t]*(\S+)", re.MULTILINE | re.IGNORECASE)
+GRID = re.compile(r"[A-R]{2}(?:\d{2}(?:[A-X]{2}(?:\d{2})?)?)?")
+
+# Band edges in MHz
+BANDS = [(1.8, 2.0, "160m"), (3.5, 4.0, "80m"), (5.06, 5.45, "60m"), (7.0, 7.3, "40m"),
+         (10.1, 10.15, "30m"), (14.0, 14.35, "20m"), (18.068, 18.168, "17m"), (21.0, 21.45, "15m"),
+         (24.89, 24.99, "12m"), (28.0, 29.7, "10m"), (50.0, 54.0, "6m"), (70.0, 71.0, "4m"),
+         (144.0, 148.0, "2m"), (222.0, 225.0, "1.25m"), (420.0, 450.0, "70cm"), (902.0, 928.0, "33cm"),
+         (1200.0, 1300.0, "23cm")]  # 1.2G in Cabrillo
+
+def band_from_mhz(mhz):
+    for low, high, band in BANDS:
+        if low <= mhz <= high:
+            return band
+    return ""
+
+def record_band(record):
+    """ BAND of the record (lower case), or the band of its FREQ (MHz). """
+    band = record.get("band", "").strip().lower()
+    if band:
+        return band
+    try:
+        return band_from_mhz(float(record.get("freq") or 0))
+    except ValueError:
+        return ""
+
+def open_log(path):
+    """ The log file memory-mapped (read only), or None for an empty file. """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def detect_format(mm):
+    return "cabrillo" if b"START-OF-LOG" in mm[:4096].upper() else "adif"
+
+def iter_adif(mm, start=0, end=None):
+    """
+    Generator of the ADIF records between the byte positions start and end, as dicts with
+    the lower case field names. Everything before <EOH> is the header and skipped.
+    """
+    end = len(mm) if end is None else end
+    record = {}
+    pos = start
+    while True:
+        tag = ADIF_TAG.search(mm, pos, end)
+        if tag is None:
+            return
+        name = tag.group(1).lower()
+        pos = tag.end()
+        if tag.group(2) is not None:
+            length = int(tag.group(2))
+            record[name.decode("ascii")] = mm[pos:pos + length].decode("utf-8", "replace")
+            pos += length  # the value can contain '<'
+        elif name == b"eor":
+            yield record
+            record = {}
+        elif name == b"eoh":
+            record = {}
+
+def cabrillo_frequency(text):
+    """ Cabrillo frequency field in MHz: kHz (14025), or band designators above 30 MHz (50, 144, 1.2G). """
+    try:
+        if text.upper().endswith("G"):
+            return float(text[:-1]) * 1000
+        value = float(text)
+    except ValueError:
+        return 0.0
+    return value if value < 1000 else value / 1000
+
+def parse_cabrillo_qso(line, my_grid=""):
+    """
+    One QSO: line (without 'QSO:') as dict with ADIF field names.
+    The line is: frequency mode date time sent-call sent-exchange rcvd-call rcvd-exchange [transmitter],
+    where both exchanges have the same number of fields.
+    """
+    tokens = line.split()
+    if len(tokens) < 6:
+        return None
+    freq, mode, date, time_on, station_call = tokens[:5]
+    rest = tokens[5:]
+    k = (len(rest) - 1) // 2
+    sent, call, rcvd = rest[:k], rest[k], rest[k + 1:2 * k + 1]
+    mhz = cabrillo_frequency(freq)
+    record = {"call": call, "freq": f"{mhz:g}", "band": band_from_mhz(mhz), "mode": mode,
+              "qso_date": date.replace("-", ""), "time_on": time_on, "station_callsign": station_call}
+    grids = [t for t in rcvd if GRID.fullmatch(t.upper())]
+    if grids:
+        record["gridsquare"] = grids[0]
+    sent_grids = [t for t in sent if GRID.fullmatch(t.upper())]
+    if sent_grids or my_grid:
+        record["my_gridsquare"] = sent_grids[0] if sent_grids else my_grid
+    return record
+
+def cabrillo_header_grid(mm):
+    """ GRID-LOCATOR of the Cabrillo header, or "". """
+    first_qso = mm.find(b"QSO:")
+    match = CABRILLO_GRID.search(mm, 0, first_qso if first_qso >= 0 else len(mm))
+    return match.group(1).decode("ascii", "replace") if match else ""
+
+def iter_cabrillo(mm, start=0, end=None, my_grid=""):
+    """ Generator of the QSOs of a Cabrillo log between the byte positions start and end, as dicts. """
+    end = len(mm) if end is None else end
+    for match in CABRILLO_QSO.finditer(mm, start, end):
+        record = parse_cabrillo_qso(match.group(1).decode("utf-8", "replace"), my_grid)
+        if record is not None:
+            yield record
+
+def split_ranges(mm, fmt, n_chunks):
+    """ Split the file into about n_chunks (start, end) byte ranges at record boundaries. """
+    size = len(mm)
+    bounds = [0]
+    for i in range(1, n_chunks):
+        pos = max(bounds[-1], size * i // n_chunks)
+        if fmt == "adif":
+            match = ADIF_EOR.search(mm, pos)
+            pos = match.end() if match else size
+        else:
+            newline = mm.find(b"\n", pos)
+            pos = newline + 1 if newline >= 0 else size
+        if pos > bounds[-1]:
+            bounds.append(pos)
+    if bounds[-1] < size:
+        bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+#####################################
+# 2. STATISTICS
+#####################################
+
+HIST_BIN_KM = 500
+HIST_BINS = 41  # 0..20000 km, the last bin also counts longer distances
+
+class LogStats:
+    """ Aggregates over the QSOs, updated with add(record), and combined with merge(other). """
+
+    def __init__(self):
+        self.qsos = 0
+        self.unresolved = 0
+        self.no_grid = 0
+        self.entities = Counter()
+        self.entity_info = {}
+        self.cq_zones = Counter()
+        self.itu_zones = Counter()
+        self.grids = Counter()
+        self.cities = Counter()
+        self.histogram = [0] * HIST_BINS
+        self.longest = {}  # band -> (km, call, grid, date)
+
+    def add(self, record, entity, distance, city):
+        """ entity: result of PrefixMatcher.find, distance in km and city name, or None. """
+        self.qsos += 1
+        if entity is None:
+            self.unresolved += 1
+        else:
+            name = entity["name"]
+            self.entities[name] += 1
+            self.entity_info[name] = (entity["continent"], entity["cq"], entity["itu"])
+            self.cq_zones[entity["cq"]] += 1
+            self.itu_zones[entity["itu"]] += 1
+        grid = record.get("gridsquare", "")[:4].upper()
+        if grid:
+            self.grids[grid] += 1
+        if city is not None:
+            self.cities[city] += 1
+        if distance is None:
+            self.no_grid += 1
+            return
+        self.histogram[min(int(distance // HIST_BIN_KM), HIST_BINS - 1)] += 1
+        band = record_band(record)
+        if distance > self.longest.get(band, (-1.0,))[0]:
+            self.longest[band] = (distance, record.get("call", ""), record.get("gridsquare", ""),
+                                  record.get("qso_date", ""))
+
+    def merge(self, other):
+        """ Add the statistics of the following part of the logs. """
+        self.qsos += other.qsos
+        self.unresolved += other.unresolved
+        self.no_grid += other.no_grid
+        self.entities.update(other.entities)
+        self.entity_info.update(other.entity_info)
+        self.cq_zones.update(other.cq_zones)
+        self.itu_zones.update(other.itu_zones)
+        self.grids.update(other.grids)
+        self.cities.update(other.cities)
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+        for band, longest in other.longest.items():
+            # the earlier QSO wins at equal distance, as in a single pass
+            if longest[0] > self.longest.get(band, (-1.0,))[0]:
+                self.longest[band] = longest
+        return self
+
+    def to_dict(self, top=None):
+        return {
+            "qsos": self.qsos, "unresolved_calls": self.unresolved, "without_distance": self.no_grid,
+            "entities": [{"name": name, "continent": self.entity_info[name][0], "cq": self.entity_info[name][1],
+                          "itu": self.entity_info[name][2], "qsos": count}
+                         for name, count in self.entities.most_common(top)],
+            "cq_zones": dict(self.cq_zones.most_common()), "itu_zones": dict(self.itu_zones.most_common()),
+            "grids": dict(self.grids.most_common(top)), "nearest_cities": dict(self.cities.most_common(top)),
+            "distance_histogram": {f"{i * HIST_BIN_KM}": count for i, count in enumerate(self.histogram)},
+            "longest_per_band": {band: {"km": round(km, 1), "call": call, "grid": grid, "date": date}
+                                 for band, (km, call, grid, date) in sorted(self.longest.items())},
+        }
+
+#####################################
+# 3. ANALYSIS
+#####################################
+
+# The matcher of the process, see init_tables
+_matcher = None
+entity_cache = LRUCache(65536)
+
+def init_tables(dxcc_path=local_csv_path, cities_path=None):
+    """ Load the prefix table (and set the city database), once per process. """
+    global _matcher
+    if cities_path:
+        set_data_path(cities_path)
+    _matcher = PrefixMatcher(load_cached(dxcc_path, load_csv_data))
+    entity_cache.clear()  # its entities are from the previous table
+
+def resolve_call(call):
+    call = call.strip().upper()
+    entity = entity_cache.get(call)
+    if entity is None:
+        entity = _matcher.find(call) or False  # False: cached as not found
+        entity_cache.put(call, entity)
+    return entity or None
+
+def analyze_records(records, stats=None):
+    stats = stats if stats is not None else LogStats()
+    for record in records:
+        entity = resolve_call(record.get("call", ""))
+        distance = city = None
+        grid = record.get("gridsquare", "").strip()
+        if grid and GRID.fullmatch(grid.upper()):
+            # the nearest city of the grid square (4 characters), like the grid statistics
+            nearest = resolve_locator(grid[:4])[2]
+            if nearest[0] is not None:
+                city = f"{nearest[0]}, {nearest[1]}"
+            my_grid = record.get("my_gridsquare", "").strip()
+            if my_grid and GRID.fullmatch(my_grid.upper()):
+                lat, lon = maidenhead_to_latlon(grid)
+                my_lat, my_lon = maidenhead_to_latlon(my_grid)
+                distance = haversine_km(my_lat, my_lon, lat, lon)
+        stats.add(record, entity, distance, city)
+    return stats
+
+def iter_records(mm, fmt, start=0, end=None, my_grid=""):
+    if fmt == "cabrillo":
+        return iter_cabrillo(mm, start, end, my_grid)
+    return (r if "my_gridsquare" in r or not my_grid else dict(r, my_gridsquare=my_grid)
+            for r in iter_adif(mm, start, end))
+
+def analyze_range(path, fmt, start, end, my_grid=""):
+    """ Statistics of the records of one file between the byte positions start and end. """
+    mm = open_log(path)
+    try:
+        return analyze_records(iter_records(mm, fmt, start, end, my_grid))
+    finally:
+        mm.close()
+
+def _init_worker(dxcc_path, cities_path):
+    init_tables(dxcc_path, cities_path)
+
+def _analyze_range_worker(task):
+    return analyze_range(*task)
+
+def plan_tasks(paths, my_grid="", chunks_per_file=1):
+    """ List of (path, format, start, end, my_grid) for the analysis. """
+    tasks = []
+    for path in paths:
+        mm = open_log(path)
+        if mm is None:
+            continue
+        try:
+            fmt = detect_format(mm)
+            grid = my_grid or (cabrillo_header_grid(mm) if fmt == "cabrillo" else "")
+            for start, end in split_ranges(mm, fmt, chunks_per_file):
+                tasks.append((path, fmt, start, end, grid))
+        finally:
+            mm.close()
+    return tasks
+
+def analyze_logs(paths, my_grid="", workers=1, dxcc_path=local_csv_path, cities_path=None, chunk_mb=16):
+    """ Statistics over all QSOs of the log files, with workers processes for workers > 1. """
+    if workers <= 1:
+        init_tables(dxcc_path, cities_path)
+        stats = LogStats()
+        for path, fmt, start, end, grid in plan_tasks(paths, my_grid):
+            mm = open_log(path)
+            try:
+                analyze_records(iter_records(mm, fmt, start, end, grid), stats)
+            finally:
+                mm.close()
+        return stats
+    # chunks of about chunk_mb, but at least one per worker
+    total = sum(os.path.getsize(p) for p in paths)
+    n_chunks = max(workers, total // (chunk_mb << 20) + 1)
+    tasks = plan_tasks(paths, my_grid, max(1, n_chunks // max(len(paths), 1)))
+    stats = LogStats()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(dxcc_path, cities_path)) as pool:
+        for part in pool.map(_analyze_range_worker, tasks):
+            stats.merge(part)
+    return stats
+
+#####################################
+# 4. MAIN
+#####################################
+
+def print_report(stats, top=20):
+    print(f"QSOs: {stats.qsos}, call signs not resolved: {stats.unresolved}, "
+          f"without distance (no grid squares): {stats.no_grid}")
+    print(f"\nDXCC entities: {len(stats.entities)}, CQ zones: {len(stats.cq_zones)}, ITU zones: {len(stats.itu_zones)}")
+    for name, count in stats.entities.most_common(top):
+        continent, cq, itu = stats.entity_info[name]
+        print(f"  {count:8d}  {name} ({continent}, CQ {cq}, ITU {itu})")
+    print(f"\nGrid squares: {len(stats.grids)}")
+    for grid, count in stats.grids.most_common(top):
+        print(f"  {count:8d}  {grid}")
+    print("\nNearest large cities of the received grid squares:")
+    for city, count in stats.cities.most_common(top):
+        print(f"  {count:8d}  {city}")
+    print("\nDistances:")
+    peak = max(stats.histogram) or 1
+    for i, count in enumerate(stats.histogram):
+        if count:
+            label = f"{i * HIST_BIN_KM}-{(i + 1) * HIST_BIN_KM}" if i < HIST_BINS - 1 else f">{i * HIST_BIN_KM}"
+            print(f"  {label:>11} km {count:8d} {'#' * max(1, 40 * count // peak)}")
+    print("\nLongest QSO per band:")
+    for band, (km, call, grid, date) in sorted(stats.longest.items()):
+        print(f"  {band or '?':>6}: {km:8.1f} km  {call} {grid} {date}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Statistics of ADIF and Cabrillo logs")
+    parser.add_argument("files", nargs="+", help="Log files (.adi, .cbr)")
+    parser.add_argument("--my-grid", default="", help="Own locator, if not in the logs")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Number of worker processes (default: 1)")
+    parser.add_argument("--top", type=int, default=20, help="Number of entities, grids and cities shown (default: 20)")
+    parser.add_argument("--json", metavar="FILE", help="Write the statistics as JSON to FILE ('-': stdout)")
+    parser.add_argument("--dxcc", default=local_csv_path, help=f"DXCC table (default: {local_csv_path})")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.dxcc):
+        print(f"{args.dxcc} not found, run hamRadioPrefix_offline.py once to download it.")
+        sys.exit(1)
+    stats = analyze_logs(args.files, args.my_grid, args.workers, args.dxcc)
+    if args.json == "-":
+        json.dump(stats.to_dict(), sys.stdout, ensure_ascii=False, indent=1)
+        print()
+    else:
+        print_report(stats, args.top)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(stats.to_dict(), f, ensure_ascii=False, indent=1)
+
+if __name__ == "__main__":
+    main()
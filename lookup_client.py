@@ -0,0 +1,123 @@
+"""
+Thin client for lookup_daemon.py, with the same interactive use as hamRadioPrefix_offline.py
+and qth_locator_distance_city.py, but the answers come from the running lookup service,
+hence the client starts without loading any tables.
+
+Execution (start python lookup_daemon.py first):
+python lookup_client.py prefix        # call sign prefix lookup
+python lookup_client.py qth           # distance and nearest large city
+python lookup_client.py stats
+"""
+
+import argparse
+import json
+import socket
+import sys
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 7373
+
+class LookupServiceError(Exception):
+    """ Error answer of the lookup service. """
+
+class LookupClient:
+    """ Blocking connection to the lookup service. """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix=None, timeout=10):
+        if unix:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(unix)
+        else:
+            self.sock = socket.create_connection((host, port), timeout)
+        self.file = self.sock.makefile("rwb")
+
+    def pipeline(self, requests):
+        """ Send all requests at once, and return their answers (dicts, in the same order). """
+        self.file.write(b"".join((json.dumps(r) + "\n").encode("utf-8") for r in requests))
+        self.file.flush()
+        answers = []
+        for _ in requests:
+            line = self.file.readline()
+            if not line:
+                raise ConnectionError("lookup service closed the connection")
+            answers.append(json.loads(line))
+        return answers
+
+    def request(self, op, **params):
+        """ One request, returns its result, raises LookupServiceError for an error answer. """
+        answer = self.pipeline([dict(params, op=op)])[0]
+        if "error" in answer:
+            raise LookupServiceError(answer["error"])
+        return answer["result"]
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+def prefix_loop(client):
+    while True: #infinite loop for input, end with ctrl-C
+        prefix_input = input("Enter call sign prefix: ").upper()
+        result = client.request("prefix", call=prefix_input)
+        if result:
+            print(f"Name: {result['name']}, Continent: {result['continent']}, ITU: {result['itu']}, CQ: {result['cq']}, Flag: {result['flag']}")
+        else:
+            print("Country not found for given prefix.")
+
+def qth_loop(client):
+    print("Compute distance and print info on nearest large city given the the own QTH locator and that of a received station. End with 'q'.")
+    my_locator = input("My locator (e.g. JO62pl for Berlin) = ")
+    my = client.request("locator", locator=my_locator)
+    while True: #loop until 'q' is pressed
+        received_locator = input("Received_locator (4 characters also work) or 'q' = ")
+        if received_locator == 'q':
+            break
+        # all queries for this locator in one round trip
+        answers = client.pipeline([
+            {"op": "locator", "locator": received_locator},
+            {"op": "distance", "from": my_locator, "to": received_locator},
+            {"op": "nearest", "locator": received_locator, "popul": 100000},
+            {"op": "nearest", "locator": received_locator, "popul": 1000000}])
+        errors = [a["error"] for a in answers if "error" in a]
+        if errors:
+            print("Error:", errors[0])
+            continue
+        rx, distance, *cities = [a["result"] for a in answers]
+        print(f"My locator: {my_locator} => lat={my['lat']:.3f}, lon={my['lon']:.3f}")
+        print(f"Received locator: {received_locator} => lat={rx['lat']:.3f}, lon={rx['lon']:.3f}")
+        print(f"Distance between locators: {distance['km']:.1f} km")
+        for popul, city in zip((100000, 1000000), cities):
+            if city is None:
+                print(f"Nearest large city > {popul} inhabitants: none found")
+                continue
+            print(f"Nearest large city > {popul} inhabitants: {city['city']}, {city['state']}, {city['country']} (approx {city['distance_km']:.1f} km away from center of {received_locator}), population: {city['population']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Client for the lookup service (lookup_daemon.py)")
+    parser.add_argument("mode", choices=["prefix", "qth", "stats"], help="Interactive prefix or QTH lookup, or service statistics")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"TCP address (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT})")
+    parser.add_argument("--unix", metavar="PATH", help="Connect to this Unix socket instead of TCP")
+    args = parser.parse_args()
+
+    try:
+        client = LookupClient(args.host, args.port, args.unix)
+    except OSError as e:
+        print(f"Cannot connect to the lookup service ({e}). Start it with: python lookup_daemon.py")
+        sys.exit(1)
+    try:
+        if args.mode == "prefix":
+            prefix_loop(client)
+        elif args.mode == "qth":
+            qth_loop(client)
+        else:
+            print(json.dumps(client.request("stats"), indent=2))
+    except (KeyboardInterrupt, EOFError):
+        print()
+    except LookupServiceError as e:
+        print("Error:", e)
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    main()
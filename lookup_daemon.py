@@ -0,0 +1,217 @@
+"""
+Lookup service, which loads the DXCC prefix table and the city database only once and then answers
+queries over a local socket, instead of starting a Python program (and parsing or even downloading
+the tables) for every query. See lookup_client.py for the interactive client.
+
+Protocol: newline-delimited JSON. Each request is one line with a JSON object, the answer is one line
+in the same order, hence requests can be pipelined (sent without waiting for the answers).
+An "id" in the request is copied into the answer.
+  {"op": "prefix", "call": "DL1ABC"}                -> {"result": {"name": ..., "continent": ..., "itu": ..., "cq": ..., "flag": ...}}
+  {"op": "locator", "locator": "JO62pl"}            -> {"result": {"lat": ..., "lon": ...}}
+  {"op": "distance", "from": "JO62pl", "to": "JN88"} -> {"result": {"km": ...}}
+  {"op": "nearest", "locator": "JN88", "popul": 1000000} (or "lat" and "lon" instead of "locator")
+                                                    -> {"result": {"city": ..., "country": ..., "distance_km": ..., "state": ..., "population": ...}}
+  {"op": "batch", "requests": [{...}, {...}]}       -> {"result": [{...}, {...}]}
+  {"op": "stats"}                                   -> {"result": {"requests": ..., "uptime_s": ..., "locator_cache": {...},
+                                                                   "data": {"dxcc": {"version": ..., "reload_ms": ...}, ...}}}
+Errors are answered with {"error": "..."}. An unknown prefix gives {"result": null}.
+
+Execution:
+python lookup_daemon.py                      # TCP on 127.0.0.1:7373
+python lookup_daemon.py --unix /tmp/lookup.sock
+python lookup_daemon.py --reload             # reload dxcc.csv and the cities when the files change
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import signal
+import sys
+import time
+
+from data_reload import HotReloader
+from hamRadioPrefix_offline import ChunkedPrefixMatcher, build_matcher, csv_url, fetch_and_store_csv_data, local_csv_path
+from qth_locator_distance_city import (city_data_info, get_city_index, haversine_km, locator_cache,
+                                       maidenhead_to_latlon, nearest_large_city, resolve_locator, set_data_path,
+                                       watch_city_data)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 7373
+# Longest request line (batches can be long)
+LINE_LIMIT = 16 * 1024 * 1024
+
+class LookupService:
+    """
+    The queries of the protocol, on the tables loaded once. handle() takes and returns a dict.
+    reload: check the table files every reload seconds, and swap in the rebuilt tables when they
+    changed (see data_reload.py), incremental: recompile only the changed parts of the DXCC table.
+    """
+
+    def __init__(self, dxcc_path=local_csv_path, reload=None, incremental=False):
+        with contextlib.redirect_stdout(sys.stderr):
+            if not os.path.exists(dxcc_path):
+                fetch_and_store_csv_data(csv_url, dxcc_path)
+        self.dxcc = HotReloader(dxcc_path, lambda path, previous: build_matcher(path, previous, incremental),
+                                reload or 2.0)
+        if reload:
+            self.dxcc.start()
+            watch_city_data(reload)
+        else:
+            self.dxcc.load()
+            get_city_index()  # load the cities now, not at the first query
+        self.started = time.time()
+        self.requests = 0
+        self.ops = {"prefix": self.prefix, "locator": self.locator, "distance": self.distance,
+                    "nearest": self.nearest, "batch": self.batch, "stats": self.stats}
+
+    def handle(self, request):
+        self.requests += 1
+        if not isinstance(request, dict):
+            return {"error": "request must be a JSON object"}
+        op = self.ops.get(request.get("op"))
+        if op is None:
+            answer = {"error": f"unknown op: {request.get('op')!r}"}
+        else:
+            try:
+                answer = {"result": op(request)}
+            except Exception as e:  # a bad request must not end the connection
+                answer = {"error": f"{type(e).__name__}: {e}"}
+        if "id" in request:
+            answer["id"] = request["id"]
+        return answer
+
+    def prefix(self, request):
+        return self.dxcc.current.find(str(request["call"]).strip().upper())
+
+    def locator(self, request):
+        lat, lon = maidenhead_to_latlon(request["locator"])
+        return {"lat": lat, "lon": lon}
+
+    def distance(self, request):
+        lat1, lon1 = maidenhead_to_latlon(request["from"])
+        lat2, lon2 = maidenhead_to_latlon(request["to"])
+        return {"km": haversine_km(lat1, lon1, lat2, lon2)}
+
+    def nearest(self, request):
+        popul = int(request.get("popul", 100000))
+        if "locator" in request:
+            city = resolve_locator(request["locator"], popul)[2]
+        else:
+            city = nearest_large_city(float(request["lat"]), float(request["lon"]), popul)
+        name, country, distance, state, population = city
+        if name is None:
+            return None
+        return {"city": name, "country": country, "distance_km": distance, "state": state,
+                "population": population}
+
+    def batch(self, request):
+        requests = request["requests"]
+        if not isinstance(requests, list):
+            raise TypeError("requests must be a list")
+        return [self.handle(r) for r in requests]
+
+    def stats(self, request):
+        dxcc = self.dxcc.info()
+        matcher = self.dxcc.current
+        if isinstance(matcher, ChunkedPrefixMatcher):
+            dxcc.update(chunks=len(matcher.chunks), chunks_rebuilt=matcher.rebuilt)
+        return {"requests": self.requests, "uptime_s": round(time.time() - self.started, 1),
+                "locator_cache": locator_cache.stats(), "data": {"dxcc": dxcc, "cities": city_data_info()}}
+
+    def handle_line(self, line):
+        try:
+            request = json.loads(line)
+        except (ValueError, RecursionError) as e:  # RecursionError: nested too deeply
+            answer = {"error": f"invalid JSON: {e}"}
+        else:
+            answer = self.handle(request)
+        return (json.dumps(answer, ensure_ascii=False) + "\n").encode("utf-8")
+
+async def handle_connection(service, reader, writer):
+    """
+    Answer the request lines of one connection in order. The queries take microseconds,
+    hence they run directly in the event loop, without threads.
+    """
+    try:
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:  # line longer than LINE_LIMIT
+                writer.write(b'{"error": "request too long"}\n')
+                break
+            if not line:
+                break
+            if line.strip():
+                writer.write(service.handle_line(line))
+                await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+        with contextlib.suppress(ConnectionError):
+            await writer.wait_closed()
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, unix=None, ready=None):
+    """ Run the server until cancelled. ready: optional callback with the server, when listening. """
+    def client_connected(reader, writer):
+        return handle_connection(service, reader, writer)
+
+    if unix:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(unix)
+        server = await asyncio.start_unix_server(client_connected, unix, limit=LINE_LIMIT)
+    else:
+        server = await asyncio.start_server(client_connected, host, port, limit=LINE_LIMIT)
+    if ready:
+        ready(server)
+    # stop cleanly with kill (SIGTERM) too, not only with Ctrl+C
+    with contextlib.suppress(NotImplementedError):  # no signal handlers on Windows
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    try:
+        async with server:
+            await server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        if unix:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(unix)
+
+def main():
+    parser = argparse.ArgumentParser(description="Lookup service for call sign prefixes, locators and nearest cities")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"TCP address (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT})")
+    parser.add_argument("--unix", metavar="PATH", help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("--dxcc", default=local_csv_path,
+                        help=f"DXCC table, downloaded if missing (default: {local_csv_path})")
+    parser.add_argument("--cities", help="City database (default: large_cities.csv next to the programs)")
+    parser.add_argument("--reload", type=float, nargs="?", const=2.0, metavar="SECONDS",
+                        help="Reload the tables when their files change, checked every SECONDS (default: 2)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="With --reload: recompile only the changed parts of the DXCC table")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.cities:
+        set_data_path(args.cities)
+    try:
+        service = LookupService(args.dxcc, args.reload, args.incremental)
+    except (OSError, ValueError) as e:
+        print(f"Cannot load the tables: {e}", file=sys.stderr)
+        sys.exit(1)
+    where = args.unix or f"{args.host}:{args.port}"
+
+    def ready(server):
+        print(f"Tables loaded in {time.perf_counter() - t0:.2f} s, listening on {where} (end with Ctrl+C)",
+              flush=True)
+
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix, ready))
+    except KeyboardInterrupt:
+        pass
+    print(f"\nStopped after {service.requests} requests.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Python version of the predictive denoiser of predictiveDenoiser.html, for recorded audio
+(WAV files or NumPy arrays), e.g. on a server without browser.
+
+Like the AudioWorklet PredictiveDenoiserProcessor, it is an adaptive line enhancer:
+an NLMS predictor of order M predicts the current sample from the samples delayed by D,
+x[n-D], ..., x[n-D-M+1]. The delay decorrelates the white noise, but keeps the correlation of
+the signal, hence the prediction is the denoised signal. mu is the NLMS step size, and with
+freeze the adaptation stops and the weights are kept.
+
+There are three implementations:
+- nlms_reference: a sample by sample port of the JavaScript code (ring buffer and all), for validation.
+- PredictiveDenoiser: block based and vectorized. Within a block of block_size samples the weights are
+  fixed, the prediction and the weight update of the block are computed with np.convolve and
+  np.correlate. With block_size=1 it is the same algorithm as the reference. With frozen weights,
+  the whole input is filtered at once, with the same result as the reference for any block size.
+- DenoiserBank: PredictiveDenoiser for many channels at once (e.g. SDR receivers), vectorized
+  across the channels, with weights, mu and freeze per channel.
+
+Execution, e.g. adapt for the first 3 seconds, then freeze:
+python predictive_denoiser.py noisy.wav denoised.wav -M 32 -D 64 --mu 0.05 --freeze-after 3
+WAV files with several channels are denoised with a DenoiserBank, each channel on its own.
+"""
+
+import argparse
+import time
+import wave
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Limits as in predictiveDenoiser.html
+MIN_ORDER, MAX_ORDER = 4, 256
+MIN_DELAY, MAX_DELAY = 1, 4096
+EPS = 1e-8
+# Largest mu * block_size of the block update. Larger blocks remove less noise than the sample by
+# sample NLMS (prediction error power 1.1x at mu * block_size = 0.2, 1.4x at 0.8), and diverge above about 1.
+MAX_BLOCK_STEP = 0.15
+
+def clamp_order(order):
+    return max(MIN_ORDER, min(MAX_ORDER, int(order)))
+
+def clamp_delay(delay):
+    return max(MIN_DELAY, min(MAX_DELAY, int(delay)))
+
+def effective_block_size(block_size, mu):
+    """ Block size used for the step size mu: block_size, but at most MAX_BLOCK_STEP / mu samples. """
+    if mu <= 0:
+        return block_size
+    return max(1, min(block_size, int(MAX_BLOCK_STEP / mu + 1e-9)))
+
+def nlms_reference(x, order=32, delay=64, mu=0.05, freeze=False, w=None, output="denoised"):
+    """
+    Sample by sample port of PredictiveDenoiserProcessor.process (without its test noise).
+    x: input samples, w: initial weights (default: zeros).
+    Returns (out, w), with out the denoised signal (output="denoised"),
+    the prediction error ("error") or the input ("noisy"), and w the final weights.
+    """
+    M = clamp_order(order)
+    D = clamp_delay(delay)
+    w = [0.0] * M if w is None else [float(v) for v in w]
+    rb_len = D + M + 2
+    rb = [0.0] * rb_len
+    rb_idx = 0
+    out = np.empty(len(x))
+    for n, noisy in enumerate(np.asarray(x, dtype=np.float64).tolist()):
+        # push into ring buffer
+        rb[rb_idx] = noisy
+        # predictor input u[i] = x[n - D - i]
+        y = 0.0
+        norm = EPS
+        for i in range(M):
+            idx = (rb_idx - (D + i)) % rb_len
+            ui = rb[idx]
+            y += w[i] * ui
+            norm += ui * ui
+        e = noisy - y
+        # NLMS update
+        if not freeze and mu > 0:
+            g = mu / norm
+            for i in range(M):
+                idx = (rb_idx - (D + i)) % rb_len
+                w[i] += g * e * rb[idx]
+        if output == "noisy":
+            out[n] = noisy
+        elif output == "error":
+            out[n] = e
+        else:
+            out[n] = y
+        # advance ring buffer
+        rb_idx += 1
+        if rb_idx >= rb_len:
+            rb_idx = 0
+    return out, np.array(w)
+
+class PredictiveDenoiser:
+    """
+    Block based, vectorized delayed-prediction NLMS denoiser, with state between calls of process(),
+    for streaming. The parameters mu and freeze can be changed between calls.
+    block_size: number of samples with fixed weights, after which the weights are updated with
+    the NLMS gradients of all samples of the block. Small blocks adapt like the sample by sample
+    version, large blocks are faster. The update of a block is about block_size sample updates at once,
+    hence the block is shortened to MAX_BLOCK_STEP / mu samples (3 at mu = 0.05, down to 1, the sample
+    by sample algorithm, from mu = 0.15 on), such that the denoising stays within a few percent of the
+    sample by sample version; block_size is only the upper limit, for small mu.
+    """
+
+    def __init__(self, order=32, delay=64, mu=0.05, freeze=False, block_size=16, output="denoised"):
+        self.M = clamp_order(order)
+        self.D = clamp_delay(delay)
+        self.mu = mu
+        self.freeze = freeze
+        self.block_size = max(1, int(block_size))
+        self.output = output
+        self.reset()
+
+    def reset(self):
+        """ Zero weights and history, like after a change of order or delay in the browser. """
+        self.w = np.zeros(self.M)
+        # the last D + M - 1 input samples, needed for the predictor input of the next samples
+        self.history = np.zeros(self.D + self.M - 1)
+
+    def process(self, x):
+        """ Denoise the next samples x (any float or int array), returns a float64 array. """
+        x = np.asarray(x, dtype=np.float64)
+        n = len(x)
+        if n == 0:
+            return np.zeros(0)
+        M = self.M
+        xx = np.concatenate((self.history, x))
+        # y[n] = sum_i w[i] x[n-D-i] = sum_i w[i] xx[n+M-1-i], i.e. np.convolve(xx, w, 'valid')
+        if self.freeze or self.mu <= 0:
+            y = np.convolve(xx[:n + M - 1], self.w, "valid")
+        else:
+            y = np.empty(n)
+            w = self.w
+            mu = self.mu
+            # input power of the predictor inputs of each sample, for all blocks at once
+            norm = EPS + np.convolve(np.square(xx[:n + M - 1]), np.ones(M), "valid")
+            L = effective_block_size(self.block_size, mu)
+            for start in range(0, n, L):
+                stop = min(start + L, n)
+                seg = xx[start:stop + M - 1]
+                y_blk = np.convolve(seg, w, "valid")
+                e_blk = (x[start:stop] - y_blk) / norm[start:stop]
+                # gradient g[i] = sum_n (e[n]/norm[n]) x[n-D-i], as correlation
+                g = np.correlate(seg, e_blk, "valid")[::-1]
+                w = w + mu * g
+                y[start:stop] = y_blk
+            self.w = w
+        self.history = xx[n:].copy()
+        if self.output == "noisy":
+            return x.copy()
+        if self.output == "error":
+            return x - y
+        return y
+
+class DenoiserBank:
+    """
+    The block based denoiser for N channels at once, e.g. several SDR receivers, on 2D blocks
+    of shape (channels, samples). Each channel has its own weights, history (the ring buffer of the
+    browser version), step size mu and freeze state (arrays with one value per channel, which can be
+    changed between calls), while order, delay and block size are the same for all channels.
+    The prediction and the NLMS update of each block of block_size samples are computed for all
+    adapting channels with one np.einsum each, on a sliding window view of the input (without
+    copying it), instead of a loop over the channels. Frozen channels are filtered in one step
+    with np.convolve, like in PredictiveDenoiser. Channel c gives the same result as PredictiveDenoiser(order, delay, mu[c],
+    freeze[c], block_size) on x[c]; channels with a shortened block (large mu) are adapted in groups.
+    """
+
+    def __init__(self, channels, order=32, delay=64, mu=0.05, freeze=False, block_size=16, output="denoised"):
+        self.channels = int(channels)
+        self.M = clamp_order(order)
+        self.D = clamp_delay(delay)
+        self.mu = np.broadcast_to(np.asarray(mu, dtype=np.float64), (self.channels,)).copy()
+        self.freeze = np.broadcast_to(np.asarray(freeze, dtype=bool), (self.channels,)).copy()
+        self.block_size = max(1, int(block_size))
+        self.output = output
+        self.reset()
+
+    def reset(self, channel=None):
+        """ Zero weights and history of all channels, or of one channel (e.g. after retuning it). """
+        if channel is None:
+            self.w = np.zeros((self.channels, self.M))
+            self.history = np.zeros((self.channels, self.D + self.M - 1))
+        else:
+            self.w[channel] = 0.0
+            self.history[channel] = 0.0
+
+    def process(self, x):
+        """ Denoise the next samples x, shape (channels, samples), returns a float64 array of that shape. """
+        x = np.asarray(x, dtype=np.float64)
+        if x.ndim != 2 or x.shape[0] != self.channels:
+            raise ValueError(f"expected a block of shape ({self.channels}, samples), got {x.shape}")
+        n = x.shape[1]
+        if n == 0:  # like PredictiveDenoiser, the state stays as it is
+            return np.zeros(x.shape)
+        xx = np.concatenate((self.history, x), axis=1)
+        y = np.empty(x.shape)
+        adapting = ~self.freeze & (self.mu > 0)
+        if adapting.any():
+            # channels with the same block size together, usually all of them
+            sizes = np.array([effective_block_size(self.block_size, mu) for mu in self.mu])
+            for L in np.unique(sizes[adapting]):
+                channels = np.flatnonzero(adapting & (sizes == L))
+                # all channels: a view, otherwise a copy of the rows of the channels
+                xa = xx if len(channels) == self.channels else xx[channels]
+                y[channels], self.w[channels] = self._adapt(xa, x[channels], self.w[channels],
+                                                            self.mu[channels], int(L))
+        for c in np.flatnonzero(~adapting):
+            # fixed weights: one filter call per channel, np.convolve is faster than the windows here
+            y[c] = np.convolve(xx[c, :n + self.M - 1], self.w[c], "valid")
+        self.history = xx[:, n:].copy()
+        if self.output == "noisy":
+            return x.copy()
+        if self.output == "error":
+            return x - y
+        return y
+
+    def _adapt(self, xx, x, w, mu, L):
+        """ Prediction and NLMS adaptation of the channels of x in blocks of L samples, returns (y, w). """
+        n = x.shape[1]
+        M = self.M
+        # u[c, k, j] = xx[c, k + j], the predictor inputs x[k-D-M+1+j] of sample k, as view
+        u = sliding_window_view(xx[:, :n + M - 1], M, axis=1)
+        # input power of each predictor input window, summed per window (a difference of running
+        # sums would lose the precision of quiet input after loud input)
+        norm = EPS + np.einsum("ckj,ckj->ck", u, u)
+        wt = w[:, ::-1].copy()  # weights in time order, like the windows
+        mu = mu[:, None]
+        y = np.empty(x.shape)
+        for start in range(0, n, L):
+            stop = min(start + L, n)
+            ub = u[:, start:stop]
+            y_blk = np.einsum("ckj,cj->ck", ub, wt)
+            e_blk = x[:, start:stop] - y_blk
+            # gradients of all samples of the block, for all channels
+            wt += mu * np.einsum("ck,ckj->cj", e_blk / norm[:, start:stop], ub)
+            y[:, start:stop] = y_blk
+        return y, wt[:, ::-1]
+
+def read_wav(path):
+    """
+    16 bit WAV file as float array in the range -1..1, and its sample rate.
+    Mono files give a 1D array, files with several channels an array of shape (channels, samples).
+    """
+    with wave.open(path, "rb") as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16 bit WAV files are supported")
+        rate = wf.getframerate()
+        channels = wf.getnchannels()
+        samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype="<i2")
+    if channels > 1:
+        samples = samples.reshape(-1, channels).T
+    return samples / 32768.0, rate
+
+def write_wav(path, x, rate):
+    """ Write x (1D, or shape (channels, samples)) as 16 bit WAV file. """
+    x = np.asarray(x)
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1 if x.ndim == 1 else x.shape[0])
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes((np.clip(x.T, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+
+def denoise(x, rate, order=32, delay=64, mu=0.05, freeze_after=None, block_size=16):
+    """
+    Denoise a whole signal, adapting only for the first freeze_after seconds (None: all the time).
+    x with shape (channels, samples) is denoised with a DenoiserBank, each channel on its own.
+    """
+    if np.ndim(x) == 2:
+        denoiser = DenoiserBank(len(x), order, delay, mu, block_size=block_size)
+    else:
+        denoiser = PredictiveDenoiser(order, delay, mu, block_size=block_size)
+    if freeze_after is None:
+        return denoiser.process(x)
+    split = int(freeze_after * rate)
+    first = denoiser.process(x[..., :split])
+    denoiser.freeze = True if np.ndim(x) == 1 else np.ones(len(x), dtype=bool)
+    return np.concatenate((first, denoiser.process(x[..., split:])), axis=-1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Predictive (NLMS) denoiser for WAV files, as predictiveDenoiser.html")
+    parser.add_argument("input", help="Noisy WAV file (16 bit, mono or several channels, e.g. SDR receivers)")
+    parser.add_argument("output", help="Denoised WAV file")
+    parser.add_argument("-M", "--order", type=int, default=32, help="Filter order M (4..256, default: 32)")
+    parser.add_argument("-D", "--delay", type=int, default=64, help="Prediction delay D (1..4096, default: 64)")
+    parser.add_argument("--mu", type=float, default=0.05, help="NLMS step size (default: 0.05)")
+    parser.add_argument("--freeze-after", type=float, metavar="SECONDS",
+                        help="Freeze the adaptation after this many seconds (default: adapt all the time)")
+    parser.add_argument("--block-size", type=int, default=16,
+                        help="Most samples per weight update, fewer for larger mu, 1: like the browser version (default: 16)")
+    args = parser.parse_args()
+
+    x, rate = read_wav(args.input)
+    t0 = time.perf_counter()
+    y = denoise(x, rate, args.order, args.delay, args.mu, args.freeze_after, args.block_size)
+    elapsed = time.perf_counter() - t0
+    write_wav(args.output, y, rate)
+    duration = x.shape[-1] / rate
+    print(f"{duration:.1f} s audio{f' ({len(x)} channels)' if x.ndim == 2 else ''} denoised in {elapsed:.2f} s ({duration / max(elapsed, 1e-9):.0f}x real time)")
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ Gerald Schuller, February 2025
 """
 
 import math
+from instrumentation import timed
 
 ############################################################
 # 1) CONVERT MAIDENHEAD (QTH) LOCATOR TO LAT/LON
@@ -119,6 +120,7 @@ large_cities_db = [
 #Once you have large_cities.csv, you can load it in your QTH-locator Python script:
 import csv
 
+@timed("qth.load_large_cities")
 def load_large_cities(csv_file):
     """ Load the filtered CSV into a list of (city, country, lat, lon, pop). """
     cities = []
@@ -136,10 +138,10 @@ def load_large_cities(csv_file):
     
 #Subset of cities > 100000 inhabitants from:
 #Cities data base: https://simplemaps.com/data/world-cities
-
-large_cities_list = load_large_cities("large_cities.csv")
+#It is loaded lazily below (get_city_index), together with its spatial index, from a binary cache (see data_cache.py)
 
 
+@timed("qth.find_nearest_large_city")
 def find_nearest_large_city(lat, lon, city_db, popul=100000):
     """
     Given a latitude/longitude and a city database,
@@ -163,24 +165,456 @@ def find_nearest_large_city(lat, lon, city_db, popul=100000):
     return nearest_city, country, min_distance, state, population
 
 
+############################################################
+# 4) SPATIAL INDEX FOR NEAREST CITY QUERIES
+############################################################
+
+import heapq
+
+# Earth's mean radius in km, as used in haversine_km
+EARTH_RADIUS_KM = 6371
+
+def latlon_to_unit_vector(lat, lon):
+    """ Map latitude/longitude in degrees to a point (x, y, z) on the unit sphere. """
+    rlat = math.radians(lat)
+    rlon = math.radians(lon)
+    return (math.cos(rlat) * math.cos(rlon),
+            math.cos(rlat) * math.sin(rlon),
+            math.sin(rlat))
+
+class CityIndex:
+    """
+    3D k-d tree over the cities of a city database, with the cities placed on the unit sphere.
+    The straight line (chord) distance on the unit sphere grows with the great circle distance,
+    hence the tree can prune with bounding boxes of its nodes, while the returned distances are
+    computed with haversine_km, exactly like in find_nearest_large_city.
+    Each node also stores the largest population below it, such that the population threshold
+    is a filter of the query, instead of a separate pass over all cities.
+    """
+
+    def __init__(self, city_db, leaf_size=8):
+        self.cities = list(city_db)
+        self.leaf_size = leaf_size
+        self.points = [latlon_to_unit_vector(city[2], city[3]) for city in self.cities]
+        self.root = self._build(list(range(len(self.cities)))) if self.cities else None
+
+    def to_tree(self):
+        """ The index as plain lists and tuples, e.g. for the binary cache. """
+        return self.cities, self.points, self.root, self.leaf_size
+
+    @classmethod
+    def from_tree(cls, cities, points, root, leaf_size):
+        """ Restore an index from to_tree(), without building the tree again. """
+        index = cls.__new__(cls)
+        index.cities, index.points, index.root, index.leaf_size = cities, points, root, leaf_size
+        return index
+
+    def _build(self, indices):
+        # A node is either a leaf: (None, lo, hi, max_pop, indices)
+        # or an inner node: (axis, lo, hi, max_pop, left, right),
+        # with lo, hi the corners of the bounding box of its points
+        points = self.points
+        lo = tuple(min(points[i][axis] for i in indices) for axis in range(3))
+        hi = tuple(max(points[i][axis] for i in indices) for axis in range(3))
+        max_pop = max(self.cities[i][5] for i in indices)
+        if len(indices) <= self.leaf_size:
+            return (None, lo, hi, max_pop, indices)
+        # split along the axis with the largest spread, at the median
+        spreads = [hi[axis] - lo[axis] for axis in range(3)]
+        axis = spreads.index(max(spreads))
+        indices.sort(key=lambda i: points[i][axis])
+        mid = len(indices) // 2
+        return (axis, lo, hi, max_pop, self._build(indices[:mid]), self._build(indices[mid:]))
+
+    def _search(self, lat, lon, popul, k=None, radius_km=None):
+        """
+        Collect the cities with population >= popul, either the k nearest ones,
+        or all within radius_km. Returns a list of (distance_km, index), sorted by
+        distance, and for equal distances by the position in the city database.
+        """
+        qx, qy, qz = latlon_to_unit_vector(lat, lon)
+        cities = self.cities
+        points = self.points
+        # max-heap of the best candidates, as (-distance, -index)
+        best = []
+        # squared chord length corresponding to the current search radius, with a small
+        # margin, such that rounding never prunes a city which should be found
+        if radius_km is None:
+            bound2 = float('inf')
+        else:
+            bound2 = (2 * math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi) / 2) + 1e-9) ** 2
+        if self.root is None:
+            return []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            lo, hi, max_pop = node[1], node[2], node[3]
+            if max_pop < popul:
+                continue
+            # squared distance from the query point to the bounding box of the node
+            d2 = 0.0
+            for c, l, h in ((qx, lo[0], hi[0]), (qy, lo[1], hi[1]), (qz, lo[2], hi[2])):
+                if c < l:
+                    d2 += (l - c) ** 2
+                elif c > h:
+                    d2 += (c - h) ** 2
+            if d2 > bound2:
+                continue
+            if node[0] is not None:
+                axis, left, right = node[0], node[4], node[5]
+                # search the side containing the query point first (pushed last)
+                if (qx, qy, qz)[axis] < left[2][axis]:
+                    stack.append(right)
+                    stack.append(left)
+                else:
+                    stack.append(left)
+                    stack.append(right)
+                continue
+            for i in node[4]:
+                city = cities[i]
+                if city[5] < popul:
+                    continue
+                px, py, pz = points[i]
+                if (px - qx) ** 2 + (py - qy) ** 2 + (pz - qz) ** 2 > bound2:
+                    continue
+                dist = haversine_km(lat, lon, city[2], city[3])
+                if radius_km is not None:
+                    if dist <= radius_km:
+                        best.append((-dist, -i))
+                    continue
+                if len(best) < k:
+                    heapq.heappush(best, (-dist, -i))
+                elif (-dist, -i) > best[0]:
+                    heapq.heapreplace(best, (-dist, -i))
+                else:
+                    continue
+                if len(best) == k:
+                    worst = -best[0][0]
+                    bound2 = (2 * math.sin(min(worst / EARTH_RADIUS_KM, math.pi) / 2) + 1e-9) ** 2
+        return sorted((-neg_dist, -neg_i) for neg_dist, neg_i in best)
+
+    def query(self, lat, lon, k=1, popul=100000):
+        """
+        Return the k nearest cities with population >= popul,
+        as a list of (distance_km, city) with city = (name, country, lat, lon, state, pop).
+        """
+        return [(dist, self.cities[i]) for dist, i in self._search(lat, lon, popul, k=k)]
+
+    def query_radius(self, lat, lon, radius_km, popul=100000):
+        """
+        Return all cities with population >= popul within radius_km, nearest first,
+        as a list of (distance_km, city).
+        """
+        return [(dist, self.cities[i]) for dist, i in self._search(lat, lon, popul, radius_km=radius_km)]
+
+    @timed("qth.city_index_nearest")
+    def nearest(self, lat, lon, popul=100000):
+        """
+        Same result as find_nearest_large_city(lat, lon, city_db, popul):
+        (city, country, distance, state, population).
+        """
+        result = self.query(lat, lon, 1, popul)
+        if not result:
+            return None, None, float('inf'), None, None
+        dist, (city_name, country_name, _, _, admin_name, pop) = result[0]
+        return city_name, country_name, dist, admin_name, pop
+
+def build_city_tree(csv_file):
+    """ Load the CSV file and build its spatial index, as plain data for the binary cache. """
+    return CityIndex(load_large_cities(csv_file)).to_tree()
+
+from data_cache import load_cached
+import os
+import threading
+
+# The city database is loaded lazily, on the first nearest city query, and then kept.
+# The default is large_cities.csv next to this file, independent of the current directory.
+DEFAULT_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "large_cities.csv")
+_data_path = DEFAULT_DATA_PATH
+_city_index = None
+_city_index_lock = threading.Lock()
+
+def set_data_path(csv_file):
+    """ Use another city CSV file (same columns as large_cities.csv), loaded on the next query. """
+    global _data_path, _city_index
+    with _city_index_lock:
+        _data_path = csv_file
+        _city_index = None
+    locator_cache.clear()
+
+def get_city_index():
+    """ The CityIndex of the city database, loaded (from the binary cache) on the first call. """
+    global _city_index
+    index = _city_index
+    if index is None:
+        with _city_index_lock:
+            if _city_index is None:
+                _city_index = CityIndex.from_tree(*load_cached(_data_path, build_city_tree))
+            index = _city_index
+    return index
+
+def get_large_cities():
+    """ The city database as list of (city, country, lat, lon, state, pop). """
+    return get_city_index().cities
+
+def nearest_large_city(lat, lon, popul=100000):
+    """
+    Nearest city with population >= popul in the city database:
+    (city, country, distance, state, population), like find_nearest_large_city.
+    """
+    return get_city_index().nearest(lat, lon, popul)
+
+_city_reloader = None
+
+def watch_city_data(interval=2.0):
+    """
+    Reload the city database in a background thread when its CSV file changes, and swap
+    in the new CityIndex atomically (see data_reload.py). Call it after set_data_path.
+    Returns the HotReloader, whose info() has the data version and the reload duration.
+    """
+    global _city_reloader
+    from data_reload import HotReloader
+
+    def build(csv_file, previous):
+        return CityIndex.from_tree(*load_cached(csv_file, build_city_tree))
+
+    def swap(reloader):
+        global _city_index
+        _city_index = reloader.current
+        locator_cache.clear()  # its results are from the old table
+
+    _city_reloader = HotReloader(_data_path, build, interval, on_swap=swap).start()
+    return _city_reloader
+
+def city_data_info():
+    """ Version and reload statistics of the city database, None without watch_city_data. """
+    return _city_reloader.info() if _city_reloader is not None else None
+
+def __getattr__(name):
+    # The former module level tables, now loaded on first access
+    if name == "large_cities_index":
+        return get_city_index()
+    if name == "large_cities_list":
+        return get_large_cities()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+############################################################
+# 5) CACHE OF RESOLVED LOCATORS
+############################################################
+
+from collections import OrderedDict
+
+class LRUCache:
+    """
+    Bounded cache, which drops the least recently used entry when it is full.
+    The counters hits, misses and evictions can be inspected with stats().
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """ The cached value for key, or None. """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'size': len(self._data), 'maxsize': self.maxsize}
+
+# In spot traffic the same grid squares repeat constantly
+locator_cache = LRUCache(4096)
+
+def normalize_locator(locator):
+    return locator.strip().upper()
+
+def resolve_locator(locator, popul=100000):
+    """
+    Decode a locator and find the nearest city with population >= popul to it, cached.
+    Returns (lat, lon, (city, country, distance, state, population)).
+    """
+    key = (normalize_locator(locator), popul)
+    result = locator_cache.get(key)
+    if result is None:
+        index = get_city_index()
+        lat, lon = maidenhead_to_latlon(key[0])
+        result = (lat, lon, index.nearest(lat, lon, popul))
+        if index is _city_index:  # not cached if a reload swapped the index meanwhile
+            locator_cache.put(key, result)
+    return result
+
+
+############################################################
+# 6) BATCH VERSIONS WITH NUMPY
+############################################################
+
+# NumPy is only needed for the batch functions, hence imported on their first call
+np = None
+
+def _require_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("The batch functions need NumPy: pip3 install numpy")
+        np = numpy
+
+def maidenhead_to_latlon_batch(locators):
+    """
+    Convert many Maidenhead locators at once to arrays of latitude and longitude in degrees.
+    The locators may have mixed precision (2, 4, 6 or 8 characters). The results are identical
+    to calling maidenhead_to_latlon on each locator, the arithmetic is done in the same order.
+    Returns (lat, lon) as NumPy float arrays.
+    """
+    _require_numpy()
+    locs = np.char.strip(np.asarray(locators, dtype=str).ravel())
+    n = len(locs)
+    lengths = np.char.str_len(locs)
+    if n and lengths.min() < 2:
+        raise ValueError("Locator must have at least 2 characters.")
+    # Character codes as an (n, 8) matrix, unused positions are 0 and masked out below
+    width = max(locs.dtype.itemsize // 4, 1)
+    codes = np.zeros((n, max(width, 8)), dtype=np.int64)
+    codes[:, :width] = locs.view(np.uint32).reshape(n, width)
+    # Ensure uppercase, np.char.upper is slow, hence only used for non-ASCII input
+    if (codes > 127).any():
+        locs = np.char.upper(locs)
+        codes[:, :width] = locs.view(np.uint32).reshape(n, width)
+    else:
+        codes -= 32 * ((codes >= ord('a')) & (codes <= ord('z')))
+    letters = codes - ord('A')
+    digits = codes - ord('0')
+
+    has_square = lengths >= 4
+    has_subsquare = lengths >= 6
+    has_extended = lengths == 8
+    # The same characters as int() in maidenhead_to_latlon have to be digits
+    for col, used in ((2, has_square), (3, has_square), (6, has_extended), (7, has_extended)):
+        bad = used & ((digits[:, col] < 0) | (digits[:, col] > 9))
+        if bad.any():
+            raise ValueError(f"Invalid locator: {str(locs[int(np.argmax(bad))])!r}")
+
+    # Field
+    lon = (letters[:, 0] * 20 - 180).astype(np.float64)
+    lat = (letters[:, 1] * 10 - 90).astype(np.float64)
+    # Square (adding 0.0 leaves the other values unchanged)
+    lon = lon + np.where(has_square, digits[:, 2] * 2, 0)
+    lat = lat + np.where(has_square, digits[:, 3], 0)
+    # Subsquare
+    lon = lon + np.where(has_subsquare, letters[:, 4] * 5.0 / 60.0, 0.0)
+    lat = lat + np.where(has_subsquare, letters[:, 5] * 2.5 / 60.0, 0.0)
+    # Extended square
+    lon = lon + np.where(has_extended, digits[:, 6] * 5.0 / 600.0, 0.0)
+    lat = lat + np.where(has_extended, digits[:, 7] * 2.5 / 600.0, 0.0)
+    # Center of cell adjustment
+    lon = lon + np.select([lengths == 4, lengths == 6, lengths == 8],
+                          [1.0, 2.5 / 60.0, (2.5 / 60.0) / 10.0], 0.0)
+    lat = lat + np.select([lengths == 4, lengths == 6, lengths == 8],
+                          [0.5, 1.25 / 60.0, (1.25 / 60.0) / 10.0], 0.0)
+    return lat, lon
+
+def _libm(func, *arrays):
+    # Apply a math function elementwise, for bitwise identical results to the scalar code
+    shape = np.broadcast(*arrays).shape
+    args = [np.broadcast_to(a, shape).ravel().tolist() for a in arrays]
+    return np.fromiter(map(func, *args), dtype=np.float64, count=int(np.prod(shape))).reshape(shape)
+
+def haversine_km_batch(lat1, lon1, lat2, lon2, exact=True):
+    """
+    Vectorized haversine_km: the arguments are arrays (or scalars), which are broadcast
+    against each other, giving e.g. a pairwise distance vector for equally long arrays.
+    With exact=True, the results are bitwise identical to haversine_km on any platform:
+    sin, cos, the squares and atan2 use the same math library calls as haversine_km, since
+    NumPy's own (often SIMD) versions can differ in the last bit, and the degrees are converted
+    with the constant of math.radians. NumPy only does the arithmetic and sqrt, which are
+    correctly rounded everywhere. exact=False uses NumPy throughout, which is several times
+    faster, with differences below 1e-9 km.
+    """
+    _require_numpy()
+    lat1, lon1, lat2, lon2 = (np.asarray(v, dtype=np.float64) for v in (lat1, lon1, lat2, lon2))
+    if exact:
+        deg_to_rad = math.pi / 180.0  # as in math.radians
+        rlat1, rlon1, rlat2, rlon2 = lat1 * deg_to_rad, lon1 * deg_to_rad, lat2 * deg_to_rad, lon2 * deg_to_rad
+        dlon = rlon2 - rlon1
+        dlat = rlat2 - rlat1
+        # the cosines before broadcasting, e.g. once per row and column of a matrix
+        a = (_libm(pow, _libm(math.sin, dlat / 2), 2.0)
+             + _libm(math.cos, rlat1) * _libm(math.cos, rlat2) * _libm(pow, _libm(math.sin, dlon / 2), 2.0))
+        c = 2 * _libm(math.atan2, np.sqrt(a), np.sqrt(1 - a))
+    else:
+        rlat1, rlon1, rlat2, rlon2 = np.radians(lat1), np.radians(lon1), np.radians(lat2), np.radians(lon2)
+        dlon = rlon2 - rlon1
+        dlat = rlat2 - rlat1
+        a = (np.sin(dlat / 2) ** 2
+             + np.cos(rlat1) * np.cos(rlat2) * np.sin(dlon / 2) ** 2)
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_KM * c
+
+def haversine_km_matrix(lat1, lon1, lat2, lon2, exact=True):
+    """
+    Full distance matrix in km between the points (lat1, lon1) (rows)
+    and the points (lat2, lon2) (columns).
+    """
+    _require_numpy()
+    return haversine_km_batch(np.asarray(lat1, dtype=np.float64)[:, None],
+                              np.asarray(lon1, dtype=np.float64)[:, None],
+                              np.asarray(lat2, dtype=np.float64)[None, :],
+                              np.asarray(lon2, dtype=np.float64)[None, :], exact=exact)
+
+
 ############################################################
 # MAIN DEMO
 ############################################################
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Distance and nearest large city of a QTH locator")
+    parser.add_argument("--reload", type=float, nargs="?", const=2.0, metavar="SECONDS",
+                        help="Reload large_cities.csv when it changes, checked every SECONDS (default: 2)")
+    args = parser.parse_args()
+    if args.reload:
+        watch_city_data(args.reload)
     print("Compute distance and print info on nearest large city given the the own QTH locator and that of a received station. End with 'q'.")
     # Your QTH locator
     #my_locator = "JO33rl"  # example
     #my_locator = "JO62pl" 
     my_locator = input("My locator (e.g. JO62pl for Berlin) = ")
+    # Convert to lat/lon, once per session
+    my_lat, my_lon = maidenhead_to_latlon(my_locator)
     # Received station’s QTH locator
     while True: #loop until 'q' is pressed
         #received_locator = "JN88"  # example, near Vienna
         received_locator = input("Received_locator (4 characters also work) or 'q' = ")
         if received_locator=='q':
             break
-        # Convert both to lat/lon
-        my_lat, my_lon = maidenhead_to_latlon(my_locator)
-        rx_lat, rx_lon = maidenhead_to_latlon(received_locator)
+        # Convert to lat/lon, and find the nearest cities (cached, see resolve_locator)
+        rx_lat, rx_lon, nearest_100k = resolve_locator(received_locator)
 
         # Calculate distance in km between the two locators
         distance = haversine_km(my_lat, my_lon, rx_lat, rx_lon)
@@ -189,8 +623,12 @@ if __name__ == "__main__":
         print(f"Distance between locators: {distance:.1f} km")
         
         # Find nearest city of size >100k and 1M to the received locator
-        for popul in {100000, 1000000}:
+        for popul in (100000, 1000000):
            #city, city_dist, population = find_nearest_large_city(rx_lat, rx_lon, large_cities_db)
-           city, country, city_dist, state, population = find_nearest_large_city(rx_lat, rx_lon, large_cities_list, popul)
+           #city, country, city_dist, state, population = find_nearest_large_city(rx_lat, rx_lon, large_cities_list, popul)
+           #city, country, city_dist, state, population = nearest_large_city(rx_lat, rx_lon, popul)
+           # the 100k city came with lat/lon above, only the 1M city is another lookup
+           nearest = nearest_100k if popul == 100000 else resolve_locator(received_locator, popul)[2]
+           city, country, city_dist, state, population = nearest
            #print(f"Nearest large city > {popul} inhabitants to {received_locator}: {city}, {state}, {country} (approx {city_dist:.1f} km away from center of {received_locator}), population: {population}")
            print(f"Nearest large city > {popul} inhabitants: {city}, {state}, {country} (approx {city_dist:.1f} km away from center of {received_locator}), population: {population}")
@@ -7,44 +7,273 @@ https://heartlandhams.org/sfi-number/#:~:text=Solar%20flux%20is%20measured%20in,
 Roughly: Values > 120: somewhat good conditions, > 150 good shortwave propagation conditions.
 Does not need a web browswer.
 Gerald Schuller, March 2024
+
+The page is only fetched again when the last reading is older than the TTL (default 10 minutes,
+the flux is measured 3 times per day), and then with If-None-Match/If-Modified-Since, such that the
+server can answer with a short "304 Not Modified". The last reading and the HTTP validators are kept in
+.datacache/solarflux.json. Each new reading is also appended to the history file solarflux_history.bin
+(12 bytes per reading), which can be displayed without network access:
+python solarfluxdisp.py --history 30
+
+For offline runs, the page can be served locally, e.g. the copy of its layout in fixtures:
+python -m http.server 8000 --directory fixtures
+python solarfluxdisp.py --url http://localhost:8000/solarflux_sx-4-en.html
 """
 
-import requests
-from bs4 import BeautifulSoup
-
-print("Program to read and display the solar flux value from www.spaceweather.gc.ca")
-
-# URL of the page to scrape
-url = "https://www.spaceweather.gc.ca/forecast-prevision/solar-solaire/solarflux/sx-4-en.php"
-
-# Send a GET request to the URL
-response = requests.get(url)
-
-# Check if the request was successful
-if response.status_code == 200:
-    # Parse the HTML content of the page
-    soup = BeautifulSoup(response.content, 'html.parser')
-    
-    # Assuming the date and time are described in a specific section before "Observed Flux Density"
-    # Find the section containing "Flux Density Values in sfu" as it includes the date and time
-    content_section = soup.find(string=lambda string: string and "Flux Density Values in sfu" in string)
-    
-    # Extract the date and time from the content section
-    if content_section:
-        # The date and time are part of the content_section string, extract them
-        date_time_info = content_section.split('for')[1].strip()
-        date, time = date_time_info.split('at')
-        date = date.strip()
-        time = time.strip()
-    else:
-        date, time = "Date not found", "Time not found"
-    
-    # Extract the Observed Flux Density
-    observed_flux_density = soup.find(string="Observed Flux Density").find_next().string.strip() if soup.find(string="Observed Flux Density") else "Flux Density not found"
-    
-    print(f"Date: {date}\nTime: {time}\nObserved Flux Density: {observed_flux_density} sfu")
-else:
-    print("Failed to retrieve the webpage")
+import argparse
+import calendar
+import json
+import os
+import re
+import struct
+import time
+from html.parser import HTMLParser
+
+URL = "https://www.spaceweather.gc.ca/forecast-prevision/solar-solaire/solarflux/sx-4-en.php"
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_FILE = os.path.join(SCRIPT_DIR, ".datacache", "solarflux.json")
+HISTORY_FILE = os.path.join(SCRIPT_DIR, "solarflux_history.bin")
+DEFAULT_TTL = 600  # seconds
+TIMEOUT = 10  # seconds
+
+#####################################
+# 1. PARSE THE PAGE
+#####################################
+
+class FluxPageParser(HTMLParser):
+    """
+    Looks only for the two texts we need, instead of building the whole document tree:
+    the heading "Flux Density Values in sfu for <date> at <time>", and the text of the
+    element after "Observed Flux Density".
+    The text between two tags can arrive in pieces (split between the chunks fed to the parser),
+    it is collected and checked at the next tag.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.heading = None
+        self.flux = None
+        self.in_flux_value = False
+        self.after_flux_label = False
+        self.pieces = []
+
+    def handle_starttag(self, tag, attrs):
+        self.handle_text()
+        if self.after_flux_label:
+            self.in_flux_value = True
+            self.after_flux_label = False
+
+    def handle_endtag(self, tag):
+        self.handle_text()
+
+    def handle_data(self, data):
+        self.pieces.append(data)
+
+    def handle_text(self):
+        text = "".join(self.pieces).strip()
+        self.pieces = []
+        if not text:
+            return
+        if self.in_flux_value:
+            self.flux = text
+            self.in_flux_value = False
+        elif self.flux is None and text == "Observed Flux Density":
+            self.after_flux_label = True
+        elif self.heading is None and "Flux Density Values in sfu" in text:
+            self.heading = text
+
+    def done(self):
+        return self.heading is not None and self.flux is not None
+
+def parse_flux_page(html, chunk_size=8192):
+    """
+    Extract the reading from the page, as dict with 'date', 'time' and 'flux' (string, as on the page).
+    The page is fed in chunks, and the parsing stops as soon as both fields were found.
+    """
+    parser = FluxPageParser()
+    for start in range(0, len(html), chunk_size):
+        parser.feed(html[start:start + chunk_size])
+        if parser.done():
+            break
+    date, time_ = "Date not found", "Time not found"
+    if parser.heading:
+        # e.g. "Flux Density Values in sfu for 2024-03-15 at 20:00 UT"
+        match = re.search(r"\bfor\b(.*)\bat\b(.*)", parser.heading)
+        if match:
+            date, time_ = match.group(1).strip(), match.group(2).strip()
+    flux = parser.flux if parser.flux is not None else "Flux Density not found"
+    return {"date": date, "time": time_, "flux": flux}
+
+def observation_time(reading):
+    """ The time of the measurement as Unix time (UTC), or None if date or time cannot be read. """
+    time_text = re.sub(r"\s*UTC?$", "", reading["time"])
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d %H%M", "%Y/%m/%d %H:%M"):
+        try:
+            return calendar.timegm(time.strptime(f"{reading['date']} {time_text}", fmt))
+        except ValueError:
+            pass
+    return None
+
+#####################################
+# 2. LOCAL HISTORY OF THE READINGS
+#####################################
+
+class FluxHistory:
+    """
+    Append-only time series of the readings, as fixed size binary records
+    (Unix time of the measurement as int64, flux as float32), in the order of time.
+    """
+
+    RECORD = struct.Struct("<qf")
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+
+    def last(self):
+        """ The newest (timestamp, flux), or None. """
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell() - f.tell() % self.RECORD.size
+                if size == 0:
+                    return None
+                f.seek(size - self.RECORD.size)
+                return self.RECORD.unpack(f.read(self.RECORD.size))
+        except OSError:
+            return None
+
+    def append(self, timestamp, flux):
+        """ Store a reading, if it is newer than the last one. Returns True if it was stored. """
+        last = self.last()
+        if last is not None and timestamp <= last[0]:
+            return False
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(self.RECORD.pack(int(timestamp), flux))
+        return True
+
+    def query(self, start=None, end=None):
+        """ List of (timestamp, flux) with start <= timestamp <= end (None: no limit). """
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return []
+        data = data[:len(data) - len(data) % self.RECORD.size]
+        return [(t, round(flux, 1)) for t, flux in self.RECORD.iter_unpack(data)
+                if (start is None or t >= start) and (end is None or t <= end)]
+
+#####################################
+# 3. CLIENT WITH CACHE
+#####################################
+
+class SolarFluxClient:
+    """
+    Reads the solar flux from the page, with a TTL cache and conditional requests.
+    get() returns the reading (dict with 'date', 'time', 'flux', 'fetched' and 'source':
+    'cache', 'not-modified' or 'network').
+    """
+
+    def __init__(self, url=URL, ttl=DEFAULT_TTL, cache_file=CACHE_FILE, history=None, timeout=TIMEOUT):
+        self.url = url
+        self.ttl = ttl
+        self.cache_file = cache_file
+        self.history = history if history is not None else FluxHistory()
+        self.timeout = timeout
+        self.session = None
+
+    def load_cache(self):
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            return cache if cache.get("url") == self.url else None
+        except (OSError, ValueError):
+            return None
+
+    def store_cache(self, cache):
+        tmp_path = f"{self.cache_file}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, self.cache_file)
+        except OSError:
+            pass  # e.g. a read-only folder, then without cache
+
+    def get(self, force=False):
+        cache = self.load_cache()
+        now = time.time()
+        if cache and not force and now - cache["fetched"] < self.ttl:
+            return dict(cache["reading"], fetched=cache["fetched"], source="cache")
+
+        import requests  # only needed when the page is fetched
+        if self.session is None:
+            self.session = requests.Session()
+        headers = {}
+        if cache:
+            if cache.get("etag"):
+                headers["If-None-Match"] = cache["etag"]
+            if cache.get("last_modified"):
+                headers["If-Modified-Since"] = cache["last_modified"]
+        response = self.session.get(self.url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cache:
+            cache["fetched"] = now
+            self.store_cache(cache)
+            return dict(cache["reading"], fetched=now, source="not-modified")
+        response.raise_for_status()
+
+        reading = parse_flux_page(response.text)
+        self.store_cache({"url": self.url, "fetched": now, "reading": reading,
+                          "etag": response.headers.get("ETag"),
+                          "last_modified": response.headers.get("Last-Modified")})
+        self.record(reading, now)
+        return dict(reading, fetched=now, source="network")
+
+    def record(self, reading, fetched):
+        """ Append the reading to the history, if it has a flux value. """
+        try:
+            flux = float(reading["flux"])
+        except ValueError:
+            return
+        timestamp = observation_time(reading)
+        self.history.append(timestamp if timestamp is not None else fetched, flux)
+
+#####################################
+# 4. MAIN
+#####################################
+
+def print_history(history, days):
+    readings = history.query(start=time.time() - days * 86400 if days else None)
+    if not readings:
+        print("No readings stored in", history.path)
+        return
+    for timestamp, flux in readings:
+        print(f"{time.strftime('%Y-%m-%d %H:%M UT', time.gmtime(timestamp))}  {flux:6.1f} sfu")
+
+def main():
+    parser = argparse.ArgumentParser(description="Display the solar flux from www.spaceweather.gc.ca")
+    parser.add_argument("--url", default=URL, help="URL of the page (default: spaceweather.gc.ca)")
+    parser.add_argument("--ttl", type=float, default=DEFAULT_TTL,
+                        help=f"Use the cached reading if it is younger than this many seconds (default: {DEFAULT_TTL})")
+    parser.add_argument("--force", action="store_true", help="Ask the server even if the cached reading is recent")
+    parser.add_argument("--history", type=float, nargs="?", const=0, metavar="DAYS",
+                        help="Show the stored readings (of the last DAYS days) without network access")
+    args = parser.parse_args()
 
+    history = FluxHistory()
+    if args.history is not None:
+        print_history(history, args.history)
+        return
 
+    print("Program to read and display the solar flux value from www.spaceweather.gc.ca")
+    client = SolarFluxClient(args.url, args.ttl, history=history)
+    try:
+        reading = client.get(force=args.force)
+    except OSError as e:  # requests.RequestException is an OSError
+        print("Failed to retrieve the webpage:", e)
+        return
+    print(f"Date: {reading['date']}\nTime: {reading['time']}\nObserved Flux Density: {reading['flux']} sfu")
 
+if __name__ == "__main__":
+    main()
@@ -31,21 +31,33 @@ mv vosk-model-small-de-0.15 de
 chmod +x speech_to_text_offline.py
 ./speech_to_text_offline.py          # English (default)
 ./speech_to_text_offline.py -l de    # German
+./speech_to_text_offline.py -l both  # English and German at the same time
 """
 
 
 import argparse
-import queue
 import sys
-import sounddevice as sd
 import json
 import os
+import queue
+import re
+import threading
+import time
+import wave
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 from vosk import Model, KaldiRecognizer
+from predictive_denoiser import PredictiveDenoiser
+import instrumentation
+from instrumentation import timed
+# sounddevice is imported in main, only for live audio, such that the file mode
+# also runs on servers without audio hardware or PortAudio
 
 # Output file
 OUTPUT_FILE = "recognizedtext.txt"
 
-q = queue.Queue()
+SAMPLERATE = 16000
 
 def int_or_str(text):
     try:
@@ -53,10 +65,176 @@ def int_or_str(text):
     except ValueError:
         return text
 
-def callback(indata, frames, time, status):
-    if status:
-        print(status, file=sys.stderr)
-    q.put(bytes(indata))
+class AudioRingBuffer:
+    """
+    Bounded buffer between the sounddevice callback and the recognition loop.
+    It consists of n_blocks preallocated int16 blocks, into which the callback copies the audio,
+    instead of creating a new bytes object for each block.
+    When the recognizer falls behind and all blocks are filled, the overflow policy decides:
+    'drop-oldest' overwrites the oldest waiting block (keeps the latency bounded),
+    'block' lets the callback wait up to one block duration for a free block,
+    and drops the new block if there is still none. If no block is waiting either (all of them
+    are being recognized), the new block is dropped with both policies.
+    """
+
+    def __init__(self, n_blocks=16, blocksize=8000, policy="drop-oldest", samplerate=SAMPLERATE):
+        if policy not in ("drop-oldest", "block"):
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        if n_blocks < 2:
+            raise ValueError("The ring buffer needs at least 2 blocks")
+        self.blocks = np.zeros((n_blocks, blocksize), dtype=np.int16)
+        self.n_frames = [0] * n_blocks
+        self.capture_times = [0.0] * n_blocks
+        self.policy = policy
+        self.block_duration = blocksize / samplerate
+        self.free = deque(range(n_blocks))
+        self.filled = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        # statistics
+        self.received = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def callback(self, indata, frames, time_info, status):
+        """ Callback for sd.RawInputStream. """
+        if status:
+            print(status, file=sys.stderr)
+        with self.cond:
+            self.received += 1
+            if not self.free:
+                if self.policy == "block":
+                    self.cond.wait_for(lambda: self.free or self.closed, self.block_duration)
+                    if not self.free:
+                        self.dropped += 1
+                        return
+                elif self.filled:
+                    self.free.append(self.filled.popleft())
+                    self.dropped += 1
+                else:  # all blocks are being recognized, nothing to overwrite
+                    self.dropped += 1
+                    return
+            i = self.free.popleft()
+        # The block is owned by the callback now, hence copied without holding the lock
+        self.blocks[i, :frames] = np.frombuffer(indata, dtype=np.int16, count=frames)
+        self.n_frames[i] = frames
+        self.capture_times[i] = time.monotonic()
+        with self.cond:
+            self.filled.append(i)
+            self.max_depth = max(self.max_depth, len(self.filled))
+            self.cond.notify_all()
+
+    def get(self, timeout=None):
+        """
+        The index of the oldest filled block, waiting up to timeout seconds, or None.
+        The block has to be given back with release(i) after processing.
+        """
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.filled or self.closed, timeout):
+                return None
+            if not self.filled:
+                return None
+            return self.filled.popleft()
+
+    def data(self, i):
+        """ The samples of block i, as a view into the preallocated buffer. """
+        return self.blocks[i, :self.n_frames[i]]
+
+    def release(self, i):
+        with self.cond:
+            self.free.append(i)
+            self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def depth(self):
+        """ Number of blocks waiting for the recognizer. """
+        with self.cond:
+            return len(self.filled)
+
+def waveform(samples):
+    """ The samples for recognizer.AcceptWaveform, without copying them into a bytes object. """
+    try:
+        from vosk import _ffi
+        return _ffi.from_buffer(samples)
+    except ImportError:
+        return samples.tobytes()
+
+class LatencyStats:
+    """ End-to-end latency from the capture of an audio block until its recognition result. """
+
+    def __init__(self, what="results"):
+        self.what = what
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, latency):
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+
+    def summary(self):
+        mean = self.total / self.count if self.count else 0.0
+        return f"mean {mean * 1000:.0f} ms, max {self.max * 1000:.0f} ms over {self.count} {self.what}"
+
+class DenoiseStage:
+    """
+    Optional noise reduction of the audio blocks before the recognizer, with the delayed-prediction
+    NLMS of predictiveDenoiser.html (see predictive_denoiser.py). The int16 block is denoised
+    in place, vectorized over the whole block. The processing time of each block is the latency
+    added to the recognition, it is collected in self.latency.
+    freeze_after: stop the adaptation after this many seconds of audio (None: adapt all the time).
+    If the output is ever not finite (diverged weights), the block is passed on unchanged and
+    the denoiser starts again from zero weights.
+    """
+
+    def __init__(self, order=32, delay=64, mu=0.05, freeze_after=None, samplerate=SAMPLERATE):
+        self.denoiser = PredictiveDenoiser(order, delay, mu)
+        self.freeze_after_frames = None if freeze_after is None else int(freeze_after * samplerate)
+        self.samplerate = samplerate
+        self.frames = 0
+        self.resets = 0
+        self.latency = LatencyStats("blocks")
+
+    def process(self, block):
+        """ Denoise the int16 samples of block in place. """
+        t0 = time.perf_counter()
+        if self.freeze_after_frames is not None and self.frames >= self.freeze_after_frames:
+            self.denoiser.freeze = True
+        y = self.denoiser.process(block * (1 / 32768))
+        if np.isfinite(y).all():
+            y *= 32768
+            np.rint(y, out=y)
+            np.clip(y, -32768, 32767, out=y)
+            block[:] = y
+        else:  # NaN or inf would give garbage int16 samples
+            self.denoiser.reset()
+            self.resets += 1
+        self.frames += len(block)
+        self.latency.add(time.perf_counter() - t0)
+
+    def summary(self):
+        audio = self.frames / self.samplerate
+        load = self.latency.total / audio if audio else 0.0
+        return (f"{self.latency.summary()}, {load * 100:.1f}% of real time"
+                f"{', frozen' if self.denoiser.freeze else ''}"
+                f"{f', {self.resets} resets after divergence' if self.resets else ''}")
+
+def print_stats(ring, latency, denoise=None, fanout=None, file=sys.stderr):
+    """ With fanout (dual recognition), the queue depth includes the blocks in flight to the recognizers. """
+    if fanout is None:
+        depth, max_depth = ring.depth(), ring.max_depth
+    else:
+        depth, max_depth = fanout.backlog(), max(ring.max_depth, fanout.max_backlog)
+    print(f"[audio] blocks received: {ring.received}, dropped: {ring.dropped}, "
+          f"queue depth: {depth} (max {max_depth}), "
+          f"recognition latency: {latency.summary()}", file=file)
+    if denoise is not None:
+        print(f"[denoise] added latency per block: {denoise.summary()}", file=file)
 
 def ensure_model_path(lang):
     model_paths = {
@@ -72,57 +250,816 @@ def ensure_model_path(lang):
         sys.exit(1)
     return path
 
-def save_text(text):
+class TranscriptWriter:
+    """
+    Writes the recognized phrases in its own thread, such that slow disks do not hold up the
+    recognition loop. The lines are collected and appended in batches, when batch_size lines
+    are waiting or after flush_interval seconds. Optionally, each phrase is also written
+    as JSON line with its word timings and confidences (from recognizer.SetWords(True)).
+    close() writes all remaining lines before it returns.
+    """
+
+    def __init__(self, path=OUTPUT_FILE, jsonl_path=None, flush_interval=1.0, batch_size=20):
+        self.path = path
+        self.jsonl_path = jsonl_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.lines_written = 0
+        self.thread = threading.Thread(target=self._run, name="TranscriptWriter")
+        self.thread.start()
+
+    def write(self, text, result=None):
+        self.queue.put((time.time(), text, result))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        text_file = open(self.path, "a", encoding="utf-8")
+        jsonl_file = open(self.jsonl_path, "a", encoding="utf-8") if self.jsonl_path else None
+        try:
+            batch = []
+            deadline = None
+            while True:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = ()  # flush interval is over
+                if item is None:  # from close()
+                    break
+                if item:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                    self._write_batch(batch, text_file, jsonl_file)
+                    batch = []
+                    deadline = None
+            if batch:
+                self._write_batch(batch, text_file, jsonl_file)
+        finally:
+            text_file.close()
+            if jsonl_file:
+                jsonl_file.close()
+
+    @timed("stt.transcript_write")
+    def _write_batch(self, batch, text_file, jsonl_file):
+        text_file.write("".join(text + "\n" for _, text, _ in batch))
+        text_file.flush()
+        if jsonl_file:
+            for timestamp, text, result in batch:
+                record = {"time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(timestamp)),
+                          "text": text, "words": (result or {}).get("result", [])}
+                # language of the dual language mode, call sign and entity of the call sign mode
+                record.update((key, result[key]) for key in RECORD_EXTRAS if result and key in result)
+                jsonl_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            jsonl_file.flush()
+        self.lines_written += len(batch)
+
+# Fields of a result, which are also written to the JSON lines
+RECORD_EXTRAS = ("language", "confidence", "call", "start", "end", "conf", "entity", "timestamp")
+
+# The writer of the running session, see main. Without it, save_text appends directly.
+transcript_writer = None
+
+def save_text(text, result=None):
+    """ Display a recognized phrase and append it to the transcript, result: the recognizer result. """
     if text.strip():
         print(f"\n✓ {text}")
-        with open(OUTPUT_FILE, "a", encoding="utf-8") as f:
-            f.write(text.strip() + "\n")
+        if transcript_writer is not None:
+            transcript_writer.write(text.strip(), result)
+        else:
+            with open(OUTPUT_FILE, "a", encoding="utf-8") as f:
+                f.write(text.strip() + "\n")
+
+############################################################
+# FILE MODE: TRANSCRIBE WAV RECORDINGS
+############################################################
+
+# Number of frames per AcceptWaveform call in the file mode
+FILE_CHUNK_FRAMES = 4000
+
+def wav_segments(paths, segment_seconds=0):
+    """
+    Split the WAV files into segments of about segment_seconds (0: whole files).
+    Returns a list of (path, start_frame, n_frames). Note that the recognizer starts
+    fresh at each segment boundary, which can cut a word there.
+    """
+    segments = []
+    for path in paths:
+        with wave.open(path, "rb") as wf:
+            if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getcomptype() != "NONE":
+                raise ValueError(f"{path}: audio file must be WAV format mono PCM (16 bit).")
+            total = wf.getnframes()
+            step = int(segment_seconds * wf.getframerate()) if segment_seconds > 0 else total
+        for start in range(0, max(total, 1), max(step, 1)):
+            segments.append((path, start, min(step, total - start)))
+    return segments
+
+def transcribe_segment(model, path, start_frame, n_frames, grammar=None):
+    """
+    Run the recognizer over a part of a WAV file, in chunks of FILE_CHUNK_FRAMES.
+    Returns (results, audio_seconds, processing_seconds, cpu_seconds), with results the
+    list of recognizer results (dicts with 'text', and 'result' with the word timings).
+    grammar: restrict the recognizer to these words (JSON list, see callsign_grammar).
+    """
+    t0 = time.perf_counter()
+    cpu0 = time.process_time()
+    results = []
+    with wave.open(path, "rb") as wf:
+        samplerate = wf.getframerate()
+        if grammar is None:
+            recognizer = KaldiRecognizer(model, samplerate)
+        else:
+            recognizer = KaldiRecognizer(model, samplerate, grammar)
+        recognizer.SetWords(True)
+        wf.setpos(start_frame)
+        remaining = n_frames
+        while remaining > 0:
+            data = wf.readframes(min(FILE_CHUNK_FRAMES, remaining))
+            if not data:
+                break
+            remaining -= len(data) // 2
+            if instrumentation.ENABLED:
+                t1 = time.perf_counter()
+                final = recognizer.AcceptWaveform(data)
+                instrumentation.observe("stt.accept_waveform", time.perf_counter() - t1)
+            else:
+                final = recognizer.AcceptWaveform(data)
+            if final:
+                results.append(json.loads(recognizer.Result()))
+        results.append(json.loads(recognizer.FinalResult()))
+    # word timings relative to the start of the file
+    offset = start_frame / samplerate
+    for result in results:
+        for word in result.get("result", []):
+            word["start"] += offset
+            word["end"] += offset
+    return results, n_frames / samplerate, time.perf_counter() - t0, time.process_time() - cpu0
+
+# The model and grammar of each worker process, loaded once by _init_worker
+_worker_model = None
+_worker_grammar = None
+
+def _init_worker(model_path, grammar=None):
+    global _worker_model, _worker_grammar
+    _worker_model = Model(model_path)
+    _worker_grammar = grammar
+
+def _transcribe_segment_worker(segment):
+    return transcribe_segment(_worker_model, *segment, _worker_grammar)
+
+def save_file_result(path, result):
+    save_text(result.get("text", ""), result)
+
+def transcribe_files(paths, model_path, jobs=1, segment_seconds=0, grammar=None, on_result=save_file_result):
+    """
+    Transcribe the WAV files, spread over jobs worker processes (each loads the model once),
+    and pass each recognizer result to on_result(path, result), in the order of the files
+    (default: write the recognized text with save_text).
+    Returns a list of (path, audio_seconds, processing_seconds, cpu_seconds) per file.
+    """
+    segments = wav_segments(paths, segment_seconds)
+    if jobs > 1:
+        pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(model_path, grammar))
+        outputs = pool.map(_transcribe_segment_worker, segments)
+    else:
+        pool = None
+        model = Model(model_path)
+        outputs = (transcribe_segment(model, *segment, grammar) for segment in segments)
+
+    summary = {}
+    try:
+        for (path, _, _), (results, *times) in zip(segments, outputs):
+            for result in results:
+                on_result(path, result)
+            summary[path] = [total + t for total, t in zip(summary.get(path, (0.0, 0.0, 0.0)), times)]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return [(path, *times) for path, times in summary.items()]
+
+def print_real_time_factors(summary):
+    for path, audio, processing, cpu in summary:
+        rtf = processing / audio if audio else 0.0
+        print(f"{path}: {audio:.1f} s audio in {processing:.1f} s (CPU {cpu:.1f} s), real-time factor {rtf:.3f}")
+
+############################################################
+# CALL SIGN MODE: SPELLED CALL SIGNS WITH A RESTRICTED GRAMMAR
+############################################################
+
+def mean_confidence(words):
+    """ Mean of the word confidences of a recognizer result (from SetWords(True)). """
+    return sum(w.get("conf", 0.0) for w in words) / len(words) if words else 0.0
+
+# Spelling words and what they stand for in the call sign
+NATO_ALPHABET = {
+    "alfa": "A", "alpha": "A", "bravo": "B", "charlie": "C", "delta": "D", "echo": "E",
+    "foxtrot": "F", "golf": "G", "hotel": "H", "india": "I", "juliett": "J", "juliet": "J",
+    "kilo": "K", "lima": "L", "mike": "M", "november": "N", "oscar": "O", "papa": "P",
+    "quebec": "Q", "romeo": "R", "sierra": "S", "tango": "T", "uniform": "U", "victor": "V",
+    "whiskey": "W", "whisky": "W", "x-ray": "X", "xray": "X", "yankee": "Y", "zulu": "Z",
+}
+CALLSIGN_WORDS = {
+    "en": dict(NATO_ALPHABET, **{
+        "zero": "0", "one": "1", "two": "2", "three": "3", "four": "4", "five": "5",
+        "six": "6", "seven": "7", "eight": "8", "nine": "9", "niner": "9",
+        "slash": "/", "stroke": "/", "portable": "/P", "mobile": "/M", "maritime": "/MM",
+    }),
+    # German operators mostly spell with the NATO alphabet, some with the German table (DIN 5009)
+    "de": dict(NATO_ALPHABET, **{
+        "anton": "A", "berta": "B", "cäsar": "C", "dora": "D", "emil": "E", "friedrich": "F",
+        "gustav": "G", "heinrich": "H", "ida": "I", "julius": "J", "kaufmann": "K", "ludwig": "L",
+        "martha": "M", "nordpol": "N", "otto": "O", "paula": "P", "quelle": "Q", "richard": "R",
+        "samuel": "S", "siegfried": "S", "theodor": "T", "ulrich": "U", "viktor": "V",
+        "wilhelm": "W", "xanthippe": "X", "ypsilon": "Y", "zacharias": "Z", "zeppelin": "Z",
+        "null": "0", "eins": "1", "zwei": "2", "zwo": "2", "drei": "3", "vier": "4", "fünf": "5",
+        "sechs": "6", "sieben": "7", "acht": "8", "neun": "9",
+        "strich": "/", "schrägstrich": "/", "portabel": "/P", "mobil": "/M",
+    }),
+}
+
+# Optional prefix (EA8/...), prefix with a digit, suffix ending with a letter, optional /P, /MM, /3 ...
+CALLSIGN_RE = re.compile(r"(?:[A-Z0-9]{1,4}/)?[A-Z0-9]{1,3}[0-9][A-Z0-9]{0,3}[A-Z](?:/[A-Z0-9]{1,4})?")
+
+def callsign_grammar(lang):
+    """ The grammar for KaldiRecognizer: the spelling words of lang, and [unk] for everything else. """
+    return json.dumps(sorted(CALLSIGN_WORDS[lang]) + ["[unk]"], ensure_ascii=False)
+
+def assemble_callsigns(words, lang, max_gap=0.8):
+    """
+    Assemble the call signs from the words of a recognizer result (with timings, from SetWords(True)).
+    A pause of more than max_gap seconds or an unknown word ends a call sign, and a call sign
+    which was spelled twice without a pause counts once. Strings which do not look like
+    a call sign are dropped. Returns a list of dicts with call, start, end and conf.
+    """
+    table = CALLSIGN_WORDS[lang]
+    callsigns = []
+    group = []
+
+    def close():
+        call = "".join(table[w["word"]] for w in group).replace("//", "/").strip("/")
+        half = len(call) // 2
+        if len(call) % 2 == 0 and call[:half] == call[half:]:
+            call = call[:half]
+        if CALLSIGN_RE.fullmatch(call):
+            callsigns.append({"call": call, "start": group[0]["start"], "end": group[-1]["end"],
+                              "conf": mean_confidence(group)})
+        group.clear()
+
+    for word in words:
+        if group and (word["word"] not in table or word["start"] - group[-1]["end"] > max_gap):
+            close()
+        if word["word"] in table:
+            group.append(word)
+    if group:
+        close()
+    return callsigns
+
+def load_prefix_matcher(csv_path):
+    """ The PrefixMatcher of hamRadioPrefix_offline.py for the DXCC table csv_path (None if it is missing). """
+    from data_cache import load_cached
+    from hamRadioPrefix_offline import PrefixMatcher, load_csv_data
+    if not os.path.exists(csv_path):
+        print(f"Warning: {csv_path} not found, call signs are not resolved "
+              "(run hamRadioPrefix_offline.py once to download it).", file=sys.stderr)
+        return None
+    return PrefixMatcher(load_cached(csv_path, load_csv_data))
+
+class CallsignOutput:
+    """
+    Resolves the call signs of each recognizer result with the PrefixMatcher right away,
+    and writes them as timestamped records: to the terminal and the transcript
+    (time, call sign, entity), and with --jsonl also with the entity data and the words.
+    """
+
+    def __init__(self, lang, matcher, max_gap=0.8):
+        self.lang = lang
+        self.matcher = matcher
+        self.max_gap = max_gap
+        self.count = 0
+
+    def add(self, result, timestamp):
+        """ result: recognizer result, timestamp(callsign): label for the time of the call sign in the audio. """
+        for callsign in assemble_callsigns(result.get("result", []), self.lang, self.max_gap):
+            entity = self.matcher.find(callsign["call"]) if self.matcher is not None else None
+            name = f"{entity['name']} ({entity['continent']}, ITU {entity['itu']}, CQ {entity['cq']})" if entity else "?"
+            label = timestamp(callsign)
+            record = dict(callsign, entity=entity, timestamp=label,
+                          result=[w for w in result["result"] if callsign["start"] <= w["start"] <= callsign["end"]])
+            save_text(f"{label} {callsign['call']} {name}", record)
+            self.count += 1
+
+    def add_live(self, result, captured):
+        """
+        Live audio: the timestamp is the local time of the start of the call sign, counted back
+        from the capture of the end of the phrase.
+        """
+        words = result.get("result", [])
+        if words:
+            captured_at = time.time() - (time.monotonic() - captured)
+            end = words[-1]["end"]
+            self.add(result, lambda callsign: time.strftime(
+                "%H:%M:%S", time.localtime(captured_at - (end - callsign["start"]))))
+
+    def add_file(self, path, result):
+        """ File mode: the timestamp is the offset of the call sign in the file. """
+        name = os.path.basename(path)
+        self.add(result, lambda callsign: f"{name}@{callsign['start']:.1f}s")
+
+def print_cpu_comparison(constrained, unconstrained):
+    """ Compare the decoding CPU of the grammar with the unconstrained model, from transcribe_files. """
+    cpu = sum(s[3] for s in constrained)
+    full = sum(s[3] for s in unconstrained)
+    audio = sum(s[1] for s in constrained)
+    print(f"Decoding CPU for {audio:.1f} s audio: call sign grammar {cpu:.1f} s, "
+          f"unconstrained model {full:.1f} s ({full / cpu if cpu else 0.0:.1f} times more)")
+
+############################################################
+# DUAL LANGUAGE MODE: ONE CAPTURE, ENGLISH AND GERMAN RECOGNIZERS
+############################################################
+
+DUAL_LANGUAGES = ("en", "de")
+
+class RecognizerWorker(threading.Thread):
+    """
+    One KaldiRecognizer in its own thread, fed with the indices of the blocks of the shared ring
+    buffer, which it reads without copying. Vosk releases the GIL in AcceptWaveform, hence the
+    recognizers of both languages run on separate cores. After each block, the worker sends
+    (lang, position, open_since, captured, result, partial) to the results queue, with position
+    the processed audio in seconds, open_since the position where the current unfinished phrase
+    began (or None), and result the final result (or None, then partial is the partial text).
+    """
+
+    def __init__(self, lang, model, fanout, results):
+        super().__init__(name=f"Recognizer-{lang}", daemon=True)
+        self.lang = lang
+        self.recognizer = KaldiRecognizer(model, SAMPLERATE)
+        self.recognizer.SetWords(True)
+        self.fanout = fanout
+        self.results = results
+        self.blocks = queue.SimpleQueue()
+        self.frames = 0
+        self.open_since = None
+        self.cpu = 0.0  # CPU time of this thread in seconds
+        self.lag = LatencyStats("blocks")
+
+    def run(self):
+        ring = self.fanout.ring
+        metrics = instrumentation.ENABLED
+        while True:
+            i = self.blocks.get()
+            if i is None:  # from stop(), after the last block
+                break
+            samples = ring.data(i)
+            captured = ring.capture_times[i]
+            start = self.frames / SAMPLERATE
+            if metrics:
+                t0 = time.perf_counter()
+            try:
+                final = self.recognizer.AcceptWaveform(waveform(samples))
+                self.frames += len(samples)
+            finally:
+                self.fanout.done(i)
+            if metrics:
+                instrumentation.observe(f"stt.accept_waveform.{self.lang}", time.perf_counter() - t0)
+            self.lag.add(time.monotonic() - captured)
+            if final:
+                self.open_since = None
+                result = json.loads(self.recognizer.Result())
+                partial = ""
+            else:
+                result = None
+                partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+                if partial and self.open_since is None:
+                    self.open_since = start
+            self.cpu = time.thread_time()
+            self.results.put((self.lang, self.frames / SAMPLERATE, self.open_since, captured, result, partial))
+        result = json.loads(self.recognizer.FinalResult())
+        self.open_since = None
+        self.cpu = time.thread_time()
+        self.results.put((self.lang, self.frames / SAMPLERATE, None, time.monotonic(), result, ""))
+
+    def stop(self):
+        self.blocks.put(None)
+
+    def summary(self):
+        audio = self.frames / SAMPLERATE
+        load = self.cpu / audio if audio else 0.0
+        return (f"CPU {self.cpu:.1f} s for {audio:.1f} s audio ({load * 100:.0f}% of real time), "
+                f"lag {self.lag.summary()}, backlog {self.blocks.qsize()} blocks")
+
+class BlockFanOut:
+    """
+    Hands each block of the ring buffer to all workers, and gives it back to the ring
+    when the last worker is done with it. At most max_in_flight blocks (default: half of the ring)
+    are handed out at once, the next blocks wait in the ring until the slowest recognizer has
+    finished one. A slow recognizer thus holds back the blocks in the ring, and the overflow policy
+    of the ring applies as with a single recognizer.
+    """
+
+    def __init__(self, ring, max_in_flight=None):
+        self.ring = ring
+        self.workers = []
+        self.pending = [0] * len(ring.blocks)
+        self.max_in_flight = max(1, len(ring.blocks) // 2) if max_in_flight is None else max_in_flight
+        self.in_flight = 0  # blocks handed out, not done by all workers yet
+        self.max_backlog = 0  # most blocks waiting in the ring or in flight
+        self.cond = threading.Condition()
+
+    def wait_slot(self, timeout=None):
+        """ Wait up to timeout seconds until a block can be handed out, returns True if so. """
+        with self.cond:
+            return self.cond.wait_for(lambda: self.in_flight < self.max_in_flight, timeout)
+
+    def dispatch(self, i):
+        with self.cond:
+            self.pending[i] = len(self.workers)
+            self.in_flight += 1
+            self.max_backlog = max(self.max_backlog, self.backlog())
+        for worker in self.workers:
+            worker.blocks.put(i)
+
+    def done(self, i):
+        with self.cond:
+            self.pending[i] -= 1
+            last = self.pending[i] == 0
+            if last:
+                self.in_flight -= 1
+                self.cond.notify_all()
+        if last:
+            self.ring.release(i)
+
+    def backlog(self):
+        """ Blocks waiting in the ring or in flight to the recognizers. """
+        return self.ring.depth() + self.in_flight
+
+class LanguageArbiter:
+    """
+    Pairs the phrases of the recognizers by their time in the audio stream (all recognizers
+    get the same blocks, hence their word times agree) and decides each utterance for the
+    language with the higher mean word confidence. An utterance is decided when every recognizer
+    has processed its audio and has no unfinished phrase that began before its end, at the latest
+    when max_wait seconds of audio after its end are processed.
+    """
+
+    def __init__(self, languages, max_wait=5.0):
+        self.languages = list(languages)
+        self.positions = dict.fromkeys(self.languages, 0.0)
+        self.open_since = dict.fromkeys(self.languages, None)
+        self.max_wait = max_wait
+        self.utterances = []  # dicts with start, end, captured and the results per language
+        self.decided_until = 0.0
+
+    def update(self, lang, position, open_since):
+        self.positions[lang] = position
+        self.open_since[lang] = open_since
+
+    def add(self, lang, result, captured):
+        """ Add a final result of the recognizer of lang, captured: capture time of its last block. """
+        words = result.get("result", [])
+        if not words:
+            return
+        start, end = words[0]["start"], words[-1]["end"]
+        if end <= self.decided_until:  # late phrase of an utterance which is already decided
+            return
+        overlapping = [u for u in self.utterances if start < u["end"] and end > u["start"]]
+        utterance = {"start": start, "end": end, "captured": captured, "results": {}}
+        for other in overlapping:  # a phrase can join two utterances of the other recognizer
+            self.utterances.remove(other)
+            utterance["start"] = min(utterance["start"], other["start"])
+            utterance["end"] = max(utterance["end"], other["end"])
+            utterance["captured"] = max(utterance["captured"], other["captured"])
+            for other_lang, results in other["results"].items():
+                utterance["results"].setdefault(other_lang, []).extend(results)
+        utterance["results"].setdefault(lang, []).append(result)
+        self.utterances.append(utterance)
+        self.utterances.sort(key=lambda u: u["start"])
+
+    def _complete(self, lang, end):
+        position = self.positions[lang]
+        if position >= end + self.max_wait:
+            return True
+        open_since = self.open_since[lang]
+        return position >= end and (open_since is None or open_since >= end)
+
+    def decide(self, flush=False):
+        """
+        The decided utterances in time order, as (result, captured), with result the merged
+        result of the chosen language, which has also 'language' and 'confidence' (per language).
+        flush: decide all, at the end of the stream.
+        """
+        decided = []
+        while self.utterances:
+            utterance = self.utterances[0]
+            if not flush and not all(self._complete(lang, utterance["end"]) for lang in self.languages):
+                break
+            self.utterances.pop(0)
+            self.decided_until = max(self.decided_until, utterance["end"])
+            candidates = {}
+            for lang, results in utterance["results"].items():
+                words = [w for r in sorted(results, key=lambda r: r["result"][0]["start"]) for w in r["result"]]
+                candidates[lang] = {"text": " ".join(w["word"] for w in words), "result": words,
+                                    "language": lang}
+            confidences = {lang: mean_confidence(c["result"]) for lang, c in candidates.items()}
+            best = max(candidates, key=confidences.get)
+            decided.append((dict(candidates[best], confidence=confidences), utterance["captured"]))
+        return decided
+
+class DualLanguageRecognizer:
+    """
+    English and German recognition of the same capture stream: the blocks of the ring buffer
+    are fanned out to a RecognizerWorker per language, and the LanguageArbiter picks the
+    language of each utterance. Used by run_dual from the main thread.
+    """
+
+    def __init__(self, models, ring, max_wait=5.0):
+        self.results = queue.SimpleQueue()
+        self.fanout = BlockFanOut(ring)
+        self.workers = [RecognizerWorker(lang, model, self.fanout, self.results) for lang, model in models.items()]
+        self.fanout.workers = self.workers
+        self.arbiter = LanguageArbiter(models, max_wait)
+        self.partials = dict.fromkeys(models, "")
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    def dispatch(self, i):
+        self.fanout.dispatch(i)
+
+    def poll(self):
+        """ Process the waiting worker messages, returns the decided utterances as (result, captured). """
+        while True:
+            try:
+                lang, position, open_since, captured, result, partial = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.arbiter.update(lang, position, open_since)
+            if result is not None:
+                self.arbiter.add(lang, result, captured)
+            self.partials[lang] = partial
+        return self.arbiter.decide()
+
+    def partial_text(self):
+        return " | ".join(f"{lang}: {text}" for lang, text in self.partials.items() if text)
+
+    def finish(self):
+        """ Stop the workers after the dispatched blocks, returns the remaining utterances. """
+        for worker in self.workers:
+            worker.stop()
+        for worker in self.workers:
+            worker.join()
+        return self.poll() + self.arbiter.decide(flush=True)
+
+    def print_stats(self, file=sys.stderr):
+        for worker in self.workers:
+            print(f"[{worker.lang}] {worker.summary()}", file=file)
+
+def save_decision(result, captured, latency):
+    confidences = ", ".join(f"{lang} {conf:.2f}" for lang, conf in result["confidence"].items())
+    print(f"\n[{result['language']}] (confidence {confidences})", end="")
+    latency.add(time.monotonic() - captured)
+    save_text(result["text"], result)
+
+def run_dual(args, model_paths):
+    import sounddevice as sd
+    print("Loading English and German models ...")
+    models = {lang: Model(model_paths[lang]) for lang in DUAL_LANGUAGES}
+
+    ring = AudioRingBuffer(args.queue_blocks, args.blocksize, args.overflow)
+    dual = DualLanguageRecognizer(models, ring)
+    latency = LatencyStats()
+    denoise = None
+    if args.denoise:
+        denoise = DenoiseStage(args.denoise_order, args.denoise_delay, args.denoise_mu,
+                               args.denoise_freeze_after)
+    next_stats = time.monotonic() + args.stats
+    wall0, cpu0 = time.monotonic(), time.process_time()
+
+    print("\nListening... Speak now! (Press Ctrl+C to stop and save)\n")
+    print("Language: English and German, the more confident one per utterance")
+    print("-" * 60)
+
+    dual.start()
+    try:
+        with sd.RawInputStream(samplerate=SAMPLERATE, blocksize=args.blocksize, device=args.device,
+                               dtype='int16', channels=1, callback=ring.callback):
+            while True:
+                # the blocks stay in the ring while both recognizers are busy
+                i = ring.get(timeout=0.1) if dual.fanout.wait_slot(0.1) else None
+                if i is not None:
+                    if denoise is not None:
+                        denoise.process(ring.data(i))
+                    dual.dispatch(i)
+                decided = dual.poll()
+                for result, captured in decided:
+                    save_decision(result, captured, latency)
+                if not decided:
+                    print(f"\r{dual.partial_text()[:80].ljust(80)}", end="", flush=True)
+                if args.stats and time.monotonic() >= next_stats:
+                    print()
+                    print_stats(ring, latency, denoise, dual.fanout)
+                    dual.print_stats()
+                    next_stats += args.stats
+
+    except KeyboardInterrupt:
+        print("\n\nStopping... Saving last phrases...")
+        ring.close()
+        for result, captured in dual.finish():
+            save_decision(result, captured, latency)
+        print_stats(ring, latency, denoise, dual.fanout)
+        dual.print_stats()
+        wall, cpu = time.monotonic() - wall0, time.process_time() - cpu0
+        print(f"[cpu] process {cpu:.1f} s in {wall:.1f} s ({cpu / wall:.2f} cores)", file=sys.stderr)
+        print(f"\nAll done! Transcript saved to → {os.path.abspath(OUTPUT_FILE)}\n")
 
 def main():
     parser = argparse.ArgumentParser(description="Offline speech recognition (English/German)")
-    parser.add_argument("-l", "--language", choices=["en", "de"], default="en",
-                        help="Language: en = English, de = German (default: en)")
+    parser.add_argument("-l", "--language", choices=["en", "de", "both"], default="en",
+                        help="Language: en = English, de = German, both = both recognizers on the same audio, "
+                             "the more confident one wins (default: en)")
     parser.add_argument("-d", "--device", type=int_or_str, help="Input device (number or substring)")
+    parser.add_argument("-b", "--blocksize", type=int, default=8000,
+                        help="Audio block size in samples at 16 kHz, smaller: lower latency, more CPU (default: 8000)")
+    parser.add_argument("-q", "--queue-blocks", type=int, default=16,
+                        help="Number of preallocated audio blocks waiting for the recognizer (default: 16)")
+    parser.add_argument("--overflow", choices=["drop-oldest", "block"], default="drop-oldest",
+                        help="What to do when the recognizer falls behind and the queue is full (default: drop-oldest)")
+    parser.add_argument("--stats", type=float, default=0, metavar="SECONDS",
+                        help="Print queue depth and latency to stderr every SECONDS (default: only at the end)")
+    parser.add_argument("-f", "--files", nargs="+", metavar="WAV",
+                        help="Transcribe WAV files (mono, 16 bit) instead of live audio")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of worker processes for the file mode (default: 1)")
+    parser.add_argument("--segment-seconds", type=float, default=0,
+                        help="Split long files into segments of this length for the workers (default: whole files)")
+    parser.add_argument("--jsonl", metavar="FILE",
+                        help="Also write each phrase with its word timings as JSON line to FILE")
+    parser.add_argument("--flush-interval", type=float, default=1.0,
+                        help="Write the transcript at the latest after this many seconds (default: 1.0)")
+    parser.add_argument("--flush-lines", type=int, default=20,
+                        help="Write the transcript when this many lines are waiting (default: 20)")
+    parser.add_argument("--callsigns", action="store_true",
+                        help="Recognize only spelled call signs (phonetic alphabet, digits, slash/portable) "
+                             "and resolve their DXCC entity, with a restricted grammar")
+    parser.add_argument("--dxcc", default="dxcc.csv",
+                        help="DXCC prefix table for --callsigns, from hamRadioPrefix_offline.py (default: dxcc.csv)")
+    parser.add_argument("--compare-cpu", action="store_true",
+                        help="File mode with --callsigns: also decode with the unconstrained model and compare the CPU time")
+    parser.add_argument("--denoise", action="store_true",
+                        help="Reduce the noise of the live audio before the recognition, as predictiveDenoiser.html")
+    parser.add_argument("--denoise-order", type=int, default=32,
+                        help="Denoiser filter order M (4..256, default: 32)")
+    parser.add_argument("--denoise-delay", type=int, default=64,
+                        help="Denoiser prediction delay D in samples (1..4096, default: 64)")
+    parser.add_argument("--denoise-mu", type=float, default=0.05,
+                        help="Denoiser NLMS step size (0..1, default: 0.05)")
+    parser.add_argument("--denoise-freeze-after", type=float, metavar="SECONDS",
+                        help="Freeze the denoiser adaptation after this many seconds (default: adapt all the time)")
     args = parser.parse_args()
 
-    model_path = ensure_model_path(args.language)
+    if args.language == "both" and args.files:
+        parser.error("-l both is only available for live audio")
+    if args.language == "both" and args.callsigns:
+        parser.error("--callsigns needs one language, en or de")
+    if not 0 <= args.denoise_mu <= 1:  # the range of the slider of predictiveDenoiser.html
+        parser.error("--denoise-mu must be between 0 and 1")
+    languages = DUAL_LANGUAGES if args.language == "both" else (args.language,)
+    model_paths = {lang: ensure_model_path(lang) for lang in languages}
+    global transcript_writer
+    transcript_writer = TranscriptWriter(OUTPUT_FILE, args.jsonl, args.flush_interval, args.flush_lines)
+    try:
+        if args.language == "both":
+            run_dual(args, model_paths)
+        else:
+            run(args, model_paths[args.language])
+    finally:
+        # writes all remaining lines, also after Ctrl+C
+        transcript_writer.close()
+        transcript_writer = None
+
+def run(args, model_path):
+    callsigns = grammar = None
+    if args.callsigns:
+        callsigns = CallsignOutput(args.language, load_prefix_matcher(args.dxcc))
+        grammar = callsign_grammar(args.language)
+
+    if args.files:
+        print(f"Transcribing {len(args.files)} file(s) with {args.jobs} worker(s) ...")
+        if callsigns is not None:
+            summary = transcribe_files(args.files, model_path, args.jobs, args.segment_seconds,
+                                       grammar, callsigns.add_file)
+        else:
+            summary = transcribe_files(args.files, model_path, args.jobs, args.segment_seconds)
+        print()
+        print_real_time_factors(summary)
+        if callsigns is not None:
+            print(f"{callsigns.count} call signs recognized.")
+            if args.compare_cpu:
+                print("Decoding again with the unconstrained model ...")
+                unconstrained = transcribe_files(args.files, model_path, args.jobs, args.segment_seconds,
+                                                 on_result=lambda path, result: None)
+                print_cpu_comparison(summary, unconstrained)
+        print(f"\nAll done! Transcript saved to → {os.path.abspath(OUTPUT_FILE)}\n")
+        return
+
+    import sounddevice as sd
     print(f"Loading {'German' if args.language == 'de' else 'English'} model ...")
     model = Model(model_path)
-    recognizer = KaldiRecognizer(model, 16000)
+    if grammar is None:
+        recognizer = KaldiRecognizer(model, SAMPLERATE)
+    else:
+        recognizer = KaldiRecognizer(model, SAMPLERATE, grammar)
     recognizer.SetWords(True)
 
+    ring = AudioRingBuffer(args.queue_blocks, args.blocksize, args.overflow)
+    latency = LatencyStats()
+    denoise = None
+    if args.denoise:
+        denoise = DenoiseStage(args.denoise_order, args.denoise_delay, args.denoise_mu,
+                               args.denoise_freeze_after)
+    next_stats = time.monotonic() + args.stats
+    frames = 0
+    cpu0 = time.thread_time()
+
     print("\nListening... Speak now! (Press Ctrl+C to stop and save)\n")
-    print("Language:", "German" if args.language == "de" else "English")
+    print("Language:", "German" if args.language == "de" else "English",
+          "(spelled call signs only)" if callsigns is not None else "")
     print("-" * 60)
 
     try:
-        with sd.RawInputStream(samplerate=16000, blocksize=8000, dtype='int16',
-                               channels=1, callback=callback):
+        with sd.RawInputStream(samplerate=SAMPLERATE, blocksize=args.blocksize, device=args.device,
+                               dtype='int16', channels=1, callback=ring.callback):
 
+            metrics = instrumentation.ENABLED  # when off, the measurements cost only this test
             while True:
-                data = q.get()
-                if recognizer.AcceptWaveform(data):
+                if metrics:
+                    t0 = time.perf_counter()
+                i = ring.get()
+                captured = ring.capture_times[i]
+                if metrics:
+                    t1 = time.perf_counter()
+                    instrumentation.observe("stt.queue_wait", t1 - t0)
+                try:
+                    if denoise is not None:
+                        denoise.process(ring.data(i))
+                        if metrics:
+                            t2 = time.perf_counter()
+                            instrumentation.observe("stt.denoise", t2 - t1)
+                            t1 = t2
+                    samples = ring.data(i)
+                    final = recognizer.AcceptWaveform(waveform(samples))
+                    frames += len(samples)
+                finally:
+                    ring.release(i)
+                if metrics:
+                    instrumentation.observe("stt.accept_waveform", time.perf_counter() - t1)
+                    instrumentation.counter("stt.blocks").inc()
+                    instrumentation.counter("stt.results" if final else "stt.partials").inc()
+                if final:
                     result = json.loads(recognizer.Result())
                     text = result.get("text", "").strip()
                     #print("text=", text, file=sys.stderr)
                     #os.system('espeak -vde -s 140 ' + text)
                     if text:
-                        save_text(text)
+                        latency.add(time.monotonic() - captured)
+                        if callsigns is not None:
+                            callsigns.add_live(result, captured)
+                        else:
+                            save_text(text, result)
                 else:
                     partial = json.loads(recognizer.PartialResult())
                     partial_text = partial.get("partial", "")
                     print(f"\r{partial_text.ljust(80)}", end="", flush=True)
+                if args.stats and time.monotonic() >= next_stats:
+                    print()
+                    print_stats(ring, latency, denoise)
+                    next_stats += args.stats
 
     except KeyboardInterrupt:
         # ←←← THIS IS THE IMPORTANT FIX ←←←
         print("\n\nStopping... Saving last phrase...")
+        ring.close()
         final_result = json.loads(recognizer.FinalResult())
         final_text = final_result.get("text", "").strip()
-        if final_text:
-            save_text(final_text)
+        if final_text and callsigns is not None:
+            callsigns.add_live(final_result, time.monotonic())
+        elif final_text:
+            save_text(final_text, final_result)
         else:
             print("No final phrase detected.")
 
+        print_stats(ring, latency, denoise)
+        # run once with and once without --callsigns to compare the decoding CPU
+        cpu, audio = time.thread_time() - cpu0, frames / SAMPLERATE
+        print(f"[cpu] decoding {cpu:.1f} s for {audio:.1f} s audio ({cpu / audio * 100 if audio else 0.0:.0f}% of real time)",
+              file=sys.stderr)
+        if instrumentation.ENABLED:
+            instrumentation.counter("stt.blocks_dropped").inc(ring.dropped)
         print(f"\nAll done! Transcript saved to → {os.path.abspath(OUTPUT_FILE)}\n")
 
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+"""
+Local stand-in for the solar flux server of solarfluxdisp.py, for the tests and benchmarks/bench_solarflux.py:
+serves a page (by default fixtures/solarflux_sx-4-en.html) with ETag and Last-Modified, and answers
+conditional requests (If-None-Match, or else If-Modified-Since) with 304 Not Modified.
+"""
+
+import email.utils
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE = os.path.join(REPO_DIR, "fixtures", "solarflux_sx-4-en.html")
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """
+    Serves FluxServer.body like the real server with validators. With etag or last_modified of the
+    server set to None, that validator is not sent (and not checked).
+    """
+
+    def do_GET(self):
+        server = self.server
+        server.request_headers.append(dict(self.headers))
+        if_none_match = self.headers.get("If-None-Match")
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if server.etag and if_none_match is not None:
+            # If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+            not_modified = if_none_match == server.etag
+        elif server.last_modified and if_modified_since is not None:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+            not_modified = email.utils.parsedate_to_datetime(server.last_modified) <= since
+        else:
+            not_modified = False
+        if not_modified:
+            server.requests_304 += 1
+            self.send_response(304)
+            self.send_validators()
+            self.end_headers()
+            return
+        server.requests_200 += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(server.body)))
+        self.send_validators()
+        self.end_headers()
+        self.wfile.write(server.body)
+
+    def send_validators(self):
+        if self.server.etag:
+            self.send_header("ETag", self.server.etag)
+        if self.server.last_modified:
+            self.send_header("Last-Modified", self.server.last_modified)
+
+    def log_message(self, *args):
+        pass
+
+class FluxServer(ThreadingHTTPServer):
+    """ The server on a free local port, in a thread: start(), url, set_page(body), shutdown(). """
+
+    def __init__(self, etag=True, last_modified=True):
+        super().__init__(("127.0.0.1", 0), FixtureHandler)
+        self.use_etag = etag
+        self.use_last_modified = last_modified
+        self.requests_200 = 0
+        self.requests_304 = 0
+        self.request_headers = []
+        with open(FIXTURE, "rb") as f:
+            self.set_page(f.read(), os.path.getmtime(FIXTURE))
+
+    def set_page(self, body, mtime):
+        """ Serve another page, modified at mtime (Unix time). """
+        self.body = body
+        self.etag = '"%s"' % hashlib.sha1(body).hexdigest() if self.use_etag else None
+        self.last_modified = email.utils.formatdate(mtime, usegmt=True) if self.use_last_modified else None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/sx-4-en.php"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
@@ -0,0 +1,48 @@
+"""
+Tests of the multi-channel DenoiserBank of predictive_denoiser.py against single-channel PredictiveDenoisers.
+
+Execution (from the repository folder):
+python -m pytest tests
+"""
+
+import os
+import sys
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from predictive_denoiser import DenoiserBank, PredictiveDenoiser
+
+RATE = 16000
+
+def compare_with_singles(x, mu=0.05, chunk=None):
+    """ Largest differences of the outputs and of the final weights, bank against single denoisers. """
+    bank = DenoiserBank(len(x), 32, 64, mu)
+    singles = [PredictiveDenoiser(32, 64, m) for m in np.broadcast_to(mu, len(x))]
+    chunk = chunk or x.shape[1]
+    y_bank = np.concatenate([bank.process(x[:, i:i + chunk]) for i in range(0, x.shape[1], chunk)], axis=1)
+    y_single = np.stack([np.concatenate([single.process(x[c, i:i + chunk]) for i in range(0, x.shape[1], chunk)])
+                         for c, single in enumerate(singles)])
+    return np.max(np.abs(y_bank - y_single)), np.max(np.abs(bank.w - np.stack([s.w for s in singles])))
+
+def test_loud_then_quiet():
+    # 10 s of full scale noise, then 1 s near silence, in one call: the input power of the quiet
+    # windows has to be as exact as in the single denoiser
+    rng = np.random.default_rng(3)
+    x = np.concatenate([rng.uniform(-1, 1, (2, 10 * RATE)), 1e-4 * rng.standard_normal((2, RATE))], axis=1)
+    y_diff, w_diff = compare_with_singles(x)
+    assert y_diff < 1e-13
+    assert w_diff < 1e-13
+
+def test_different_step_sizes_in_chunks():
+    rng = np.random.default_rng(4)
+    x = 0.3 * rng.standard_normal((4, RATE))
+    y_diff, w_diff = compare_with_singles(x, mu=[0.01, 0.05, 0.2, 1.0], chunk=777)
+    assert y_diff < 1e-12
+    assert w_diff < 1e-12
+
+def test_empty_block():
+    bank = DenoiserBank(3, freeze=[True, False, True])
+    assert bank.process(np.zeros((3, 0))).shape == (3, 0)
@@ -0,0 +1,62 @@
+"""
+Tests of the ADIF reading of log_analyzer.py: the values of fixtures/sample_log.adi by their declared
+lengths, and a deliberately malformed record, whose lengths include the following space.
+
+Execution (from the repository folder):
+python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from log_analyzer import analyze_records, init_tables, iter_adif, open_log, resolve_call
+
+SAMPLE_LOG = os.path.join(REPO_DIR, "fixtures", "sample_log.adi")
+DXCC = os.path.join(REPO_DIR, "fixtures", "dxcc_sample.csv")
+
+# Lengths one too long, as written by some loggers: each value ends with the space before the next tag
+MALFORMED = (b"<ADIF_VER:5>3.1.4 <EOH>\n"
+             b"<CALL:6>K1ABC <GRIDSQUARE:5>FN42 <MY_GRIDSQUARE:7>JO62pl <BAND:4>20m <EOR>\n")
+
+@pytest.fixture(scope="module")
+def tables():
+    init_tables(DXCC)
+
+def read_sample():
+    mm = open_log(SAMPLE_LOG)
+    try:
+        return list(iter_adif(mm))
+    finally:
+        mm.close()
+
+def test_sample_values_have_declared_lengths():
+    records = read_sample()
+    assert [r["call"] for r in records] == ["K1ABC", "OE3XYZ", "JA1ABC/P", "F5XYZ", "VK2ABC", "DL1ABC"]
+    for record in records:
+        assert all(value == value.strip() for value in record.values())
+    assert records[2]["comment"] == "tnx <3 for QSO"  # the length, not the '<', ends the value
+
+def test_malformed_lengths_keep_trailing_space():
+    record, = iter_adif(MALFORMED)
+    assert record == {"call": "K1ABC ", "gridsquare": "FN42 ", "my_gridsquare": "JO62pl ", "band": "20m "}
+
+def test_malformed_record_resolves_like_correct_one(tables):
+    record, = iter_adif(MALFORMED)
+    correct = {key: value.strip() for key, value in record.items()}
+    stats, expected = analyze_records([record]), analyze_records([correct])
+    assert stats.entities == expected.entities == {"United States of America": 1}
+    assert stats.grids == expected.grids == {"FN42": 1}
+    assert stats.longest["20m"][0] == expected.longest["20m"][0]
+    assert stats.no_grid == 0 and stats.unresolved == 0
+
+def test_sample_log_analysis(tables):
+    records = read_sample()
+    stats = analyze_records(records)
+    assert stats.qsos == 6 and stats.unresolved == 0
+    assert stats.entities["United States of America"] == 1
+    assert resolve_call(records[0]["call"])["name"] == "United States of America"
@@ -0,0 +1,74 @@
+"""
+Tests of the request handling of lookup_daemon.py: bad requests are answered with {"error": ...},
+and the connection stays open for the next requests.
+
+Execution (from the repository folder):
+python -m pytest tests
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from lookup_daemon import LookupService, serve
+
+DXCC = os.path.join(REPO_DIR, "fixtures", "dxcc_sample.csv")
+
+BAD_REQUESTS = [
+    "not json",
+    "[" * 100000,  # nested too deeply for the JSON parser
+    '{"a": ' * 100000,
+    '{"op": "batch", "requests": ' + "[" * 100000 + "]" * 100000 + "}",
+    "[1, 2]",
+    '{"op": "unknown"}',
+    '{"op": "prefix"}',
+    '{"op": "locator", "locator": 123}',
+    '{"op": "distance", "from": [1], "to": null}',
+    '{"op": "nearest", "lat": {}}',
+    '{"op": "batch", "requests": 5}',
+]
+
+@pytest.fixture(scope="module")
+def service():
+    return LookupService(DXCC)
+
+@pytest.mark.parametrize("line", BAD_REQUESTS)
+def test_bad_request(service, line):
+    answer = json.loads(service.handle_line(line))
+    assert "error" in answer and "result" not in answer
+
+def test_error_keeps_id(service):
+    answer = json.loads(service.handle_line('{"op": "locator", "locator": 123, "id": 7}'))
+    assert answer["id"] == 7 and "error" in answer
+
+def test_good_request(service):
+    answer = json.loads(service.handle_line('{"op": "locator", "locator": "JO50"}'))
+    assert answer == {"result": {"lat": 50.5, "lon": 11.0}}
+
+def test_connection_survives_bad_requests(service):
+    async def session():
+        started = asyncio.get_running_loop().create_future()
+        server_task = asyncio.create_task(serve(service, "127.0.0.1", 0, ready=started.set_result))
+        server = await started
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        answers = []
+        for line in BAD_REQUESTS + ['{"op": "locator", "locator": "JO50", "id": "last"}']:
+            writer.write(line.encode() + b"\n")
+            await writer.drain()
+            answers.append(json.loads(await reader.readline()))
+        writer.close()
+        await writer.wait_closed()
+        server_task.cancel()
+        await asyncio.gather(server_task, return_exceptions=True)
+        return answers
+
+    answers = asyncio.run(session())
+    assert all("error" in answer for answer in answers[:-1])
+    assert answers[-1] == {"result": {"lat": 50.5, "lon": 11.0}, "id": "last"}
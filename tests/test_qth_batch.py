@@ -0,0 +1,63 @@
+"""
+Tests of the batch functions of qth_locator_distance_city.py against the scalar functions, on random inputs:
+exact=True is bitwise identical, exact=False within 1e-9 km.
+
+Execution (from the repository folder):
+python -m pytest tests
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+
+from generators import random_locators
+from qth_locator_distance_city import (haversine_km, haversine_km_batch, haversine_km_matrix,
+                                       maidenhead_to_latlon, maidenhead_to_latlon_batch)
+
+def random_points(rng, n):
+    return rng.uniform(-90, 90, n), rng.uniform(-180, 180, n)
+
+def scalar_distances(lat1, lon1, lat2, lon2):
+    return [haversine_km(*args) for args in zip(lat1.tolist(), lon1.tolist(), lat2.tolist(), lon2.tolist())]
+
+@pytest.mark.parametrize("seed", range(3))
+def test_pairwise_exact(seed):
+    rng = np.random.default_rng(seed)
+    points = random_points(rng, 20000) + random_points(rng, 20000)
+    assert haversine_km_batch(*points).tolist() == scalar_distances(*points)
+
+def test_pairwise_close_and_antipodal():
+    # the ends of the atan2 range: nearly the same point, and near (not exactly at, where the
+    # scalar function runs out of the domain of sqrt) the opposite point
+    rng = np.random.default_rng(5)
+    lat1, lon1 = random_points(rng, 20000)
+    near = rng.uniform(-1e-6, 1e-6, (2, 20000))
+    opposite = rng.choice([-1, 1], (2, 20000)) * rng.uniform(1e-3, 1e-1, (2, 20000))
+    for lat2, lon2 in ((lat1 + near[0], lon1 + near[1]), (-lat1 + opposite[0], lon1 + 180 + opposite[1])):
+        assert haversine_km_batch(lat1, lon1, lat2, lon2).tolist() == scalar_distances(lat1, lon1, lat2, lon2)
+
+def test_matrix_exact():
+    rng = np.random.default_rng(6)
+    lat1, lon1 = random_points(rng, 150)
+    lat2, lon2 = random_points(rng, 120)
+    matrix = haversine_km_matrix(lat1, lon1, lat2, lon2)
+    assert matrix.shape == (150, 120)
+    assert matrix.tolist() == [[haversine_km(a, b, c, d) for c, d in zip(lat2.tolist(), lon2.tolist())]
+                               for a, b in zip(lat1.tolist(), lon1.tolist())]
+
+def test_numpy_within_bound():
+    rng = np.random.default_rng(7)
+    points = random_points(rng, 50000) + random_points(rng, 50000)
+    difference = np.abs(haversine_km_batch(*points, exact=False) - np.array(scalar_distances(*points)))
+    assert difference.max() < 1e-9
+
+def test_locators():
+    locators = random_locators(20000, seed=8)
+    lat, lon = maidenhead_to_latlon_batch(locators)
+    assert list(zip(lat.tolist(), lon.tolist())) == [maidenhead_to_latlon(loc) for loc in locators]
@@ -0,0 +1,174 @@
+"""
+Tests of solarfluxdisp.py: the page parser, on the page in fixtures and on variants of its markup,
+the history file, and the client with its TTL cache and conditional requests (ETag/If-None-Match and
+Last-Modified/If-Modified-Since), against the local server of flux_server.py.
+
+Execution (from the repository folder):
+python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from flux_server import FIXTURE, FluxServer
+from solarfluxdisp import FluxHistory, SolarFluxClient, observation_time, parse_flux_page
+
+EXPECTED = {"date": "2024-03-15", "time": "20:00 UT", "flux": "157.2"}
+
+def read_fixture():
+    with open(FIXTURE, encoding="utf-8") as f:
+        return f.read()
+
+def test_fixture_reading():
+    reading = parse_flux_page(read_fixture())
+    assert reading == EXPECTED
+    assert float(reading["flux"]) == 157.2
+    assert observation_time(reading) == 1710532800
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 100, 8192])
+def test_fixture_reading_in_chunks(chunk_size):
+    # the page arrives in chunks, the values may be split between them
+    assert parse_flux_page(read_fixture(), chunk_size) == EXPECTED
+
+def test_same_as_beautifulsoup():
+    # the lookup of the original program, with BeautifulSoup
+    bs4 = pytest.importorskip("bs4")
+    soup = bs4.BeautifulSoup(read_fixture(), "html.parser")
+    heading = soup.find(string=lambda string: string and "Flux Density Values in sfu" in string)
+    observed = soup.find(string="Observed Flux Density").find_next().string.strip()
+    assert heading.split("for")[1].split("at")[0].strip() == EXPECTED["date"]
+    assert parse_flux_page(read_fixture())["flux"] == observed
+
+@pytest.mark.parametrize("row", [
+    "<tr><td>Observed Flux Density</td><td>98.4</td></tr>",
+    "<tr><th scope='row'> Observed Flux Density </th>\n<td class='text-right'>\n 98.4 \n</td></tr>",
+    "<tr><td>Observed Flux Density</td><td><strong>98.4</strong></td></tr>",
+    "<dl><dt>Observed Flux Density</dt><dd>98.4</dd></dl>",
+])
+def test_markup_variants(row):
+    html = (f"<html><body><h2>Flux Density Values in sfu for 2024-06-01 at 17:00 UT</h2>"
+            f"<table>{row}<tr><td>Adjusted Flux Density</td><td>101.0</td></tr></table></body></html>")
+    assert parse_flux_page(html) == {"date": "2024-06-01", "time": "17:00 UT", "flux": "98.4"}
+
+def test_missing_values():
+    assert parse_flux_page("<html><body><p>Service unavailable</p></body></html>") == {
+        "date": "Date not found", "time": "Time not found", "flux": "Flux Density not found"}
+
+#####################################
+# HISTORY
+#####################################
+
+def test_history_append_and_query(tmp_path):
+    history = FluxHistory(str(tmp_path / "history.bin"))
+    assert history.query() == [] and history.last() is None
+    assert history.append(1000, 150.0)
+    assert history.append(2000, 160.2)
+    assert not history.append(2000, 170.0)  # not newer than the last one
+    assert not history.append(1500, 170.0)
+    assert history.query() == [(1000, 150.0), (2000, 160.2)]
+    assert history.query(start=1500) == [(2000, 160.2)]
+    assert history.query(end=1500) == [(1000, 150.0)]
+    assert history.last()[0] == 2000
+
+def test_history_ignores_partial_record(tmp_path):
+    path = tmp_path / "history.bin"
+    history = FluxHistory(str(path))
+    history.append(1000, 150.0)
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02\x03")  # e.g. interrupted while writing
+    assert history.query() == [(1000, 150.0)]
+    assert history.last()[0] == 1000
+
+#####################################
+# CLIENT WITH CACHE
+#####################################
+
+@pytest.fixture
+def server(request):
+    validators = getattr(request, "param", {})
+    server = FluxServer(**validators).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def make_client(server, tmp_path, ttl=600):
+    history = FluxHistory(str(tmp_path / "history.bin"))
+    return SolarFluxClient(server.url, ttl, str(tmp_path / "solarflux.json"), history)
+
+def test_fetch_stores_reading_and_history(server, tmp_path):
+    client = make_client(server, tmp_path)
+    reading = client.get()
+    assert reading["source"] == "network"
+    assert {key: reading[key] for key in EXPECTED} == EXPECTED
+    assert client.history.query() == [(1710532800, 157.2)]
+    assert (server.requests_200, server.requests_304) == (1, 0)
+
+def test_ttl_cache_hit_without_request(server, tmp_path):
+    client = make_client(server, tmp_path)
+    first = client.get()
+    for _ in range(3):
+        reading = client.get()
+        assert reading["source"] == "cache"
+        assert reading["fetched"] == first["fetched"]
+    assert len(server.request_headers) == 1
+
+def test_revalidation_with_etag(server, tmp_path):
+    client = make_client(server, tmp_path, ttl=0)
+    client.get()
+    reading = client.get()
+    assert reading["source"] == "not-modified"
+    assert {key: reading[key] for key in EXPECTED} == EXPECTED
+    assert server.request_headers[-1]["If-None-Match"] == server.etag
+    assert (server.requests_200, server.requests_304) == (1, 1)
+
+@pytest.mark.parametrize("server", [{"etag": False}], indirect=True)
+def test_revalidation_with_last_modified(server, tmp_path):
+    client = make_client(server, tmp_path, ttl=0)
+    client.get()
+    reading = client.get()
+    assert reading["source"] == "not-modified"
+    assert "If-None-Match" not in server.request_headers[-1]
+    assert server.request_headers[-1]["If-Modified-Since"] == server.last_modified
+    assert (server.requests_200, server.requests_304) == (1, 1)
+
+@pytest.mark.parametrize("server", [{"etag": False}], indirect=True)
+def test_modified_since_gives_new_page(server, tmp_path):
+    client = make_client(server, tmp_path, ttl=0)
+    client.get()
+    with open(FIXTURE, "rb") as f:
+        page = f.read().replace(b"<td>157.2</td>", b"<td>160.4</td>").replace(b"20:00 UT", b"23:00 UT")
+    server.set_page(page, os.path.getmtime(FIXTURE) + 3600)
+    reading = client.get()
+    assert reading["source"] == "network" and reading["flux"] == "160.4"
+    assert client.history.query() == [(1710532800, 157.2), (1710543600, 160.4)]
+
+def test_cached_reading_survives_304(server, tmp_path):
+    client = make_client(server, tmp_path, ttl=0)
+    first = client.get()
+    for _ in range(3):
+        reading = client.get()
+        assert reading["source"] == "not-modified"
+        assert reading["fetched"] >= first["fetched"]
+    cache = client.load_cache()
+    assert cache["reading"] == EXPECTED
+    assert cache["etag"] == server.etag and cache["last_modified"] == server.last_modified
+    assert cache["fetched"] == reading["fetched"]  # renewed, the TTL starts again
+    assert client.history.query() == [(1710532800, 157.2)]  # a 304 adds no reading
+    # with the renewed fetch time, a client with TTL answers from the cache again
+    assert make_client(server, tmp_path).get()["source"] == "cache"
+
+def test_changed_page_replaces_cache(server, tmp_path):
+    client = make_client(server, tmp_path, ttl=0)
+    client.get()
+    old_etag = server.etag
+    with open(FIXTURE, "rb") as f:
+        server.set_page(f.read().replace(b"<td>157.2</td>", b"<td>158.0</td>"), os.path.getmtime(FIXTURE) + 60)
+    reading = client.get()
+    assert reading["source"] == "network" and reading["flux"] == "158.0"
+    assert server.request_headers[-1]["If-None-Match"] == old_etag
+    assert client.load_cache()["etag"] == server.etag